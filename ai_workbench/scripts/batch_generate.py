@@ -1,16 +1,20 @@
 import sys
-import pickle
 import ollama
 import json
 import re
+import numpy as np
+import torch
+import pyarrow.parquet as pq
 from sqlalchemy import create_engine, text, Column, String, Text
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
 from tqdm import tqdm
+from encoder import check_corpus_backend, load_encoder
 
 # --- Configuration ---
 MAIN_DB_URL = "sqlite:///hospital.db"
-EMBEDDINGS_PATH = "ai_workbench/db/icd10_embeddings.pkl"
+EMBEDDINGS_PATH = "ai_workbench/db/icd10_embeddings.npy"
+CODES_PATH = "ai_workbench/db/icd10_codes.parquet"
 MODEL_NAME = "llama3.1"
 
 # --- Database Setup ---
@@ -29,14 +33,19 @@ class CodeDefinition(Base):
 
 # --- AI Resources ---
 print("Loading Search Resources...")
-search_model = SentenceTransformer('all-MiniLM-L6-v2')
-with open(EMBEDDINGS_PATH, 'rb') as f:
-    search_data = pickle.load(f)
+# Same encoder create_embeddings.py built the corpus with, so queries land in the same space
+search_model = load_encoder()
+check_corpus_backend(search_model, CODES_PATH)
+search_data = {
+    "descriptions": pq.read_table(CODES_PATH, columns=["description"]).column("description").to_pylist(),
+    # Stored as float16; semantic_search wants float32 to match the query
+    "embeddings": torch.from_numpy(np.load(EMBEDDINGS_PATH).astype(np.float32))
+}
 print("Resources Loaded.")
 
 def get_icd_hints(query, top_k=5):
     if not query: return []
-    query_embedding = search_model.encode(query, convert_to_tensor=True)
+    query_embedding = torch.from_numpy(search_model.encode([query]))
     corpus_embeddings = search_data['embeddings']
     hits = util.semantic_search(query_embedding, corpus_embeddings, top_k=top_k)[0]
     
@@ -1,18 +1,45 @@
 import sys
-import pickle
+import os
 import ollama
 import json
 import re
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy import Column, String, Text
-from sentence_transformers import SentenceTransformer, util
 from tqdm import tqdm
+import faiss
+import pyarrow.parquet as pq
+from encoder import check_corpus_backend, load_encoder
 
 # --- Configuration ---
 MAIN_DB_URL = "sqlite:///hospital.db"
-EMBEDDINGS_PATH = "ai_workbench/db/icd10_embeddings.pkl"
+EMBEDDINGS_PATH = "ai_workbench/db/icd10_embeddings.npy"
+CODES_PATH = "ai_workbench/db/icd10_codes.parquet"
+INDEX_PATH = "ai_workbench/db/icd10.faiss"  # Built by create_embeddings.py
+IVF_NPROBE = 16  # Coarse cells scanned per query
 MODEL_NAME = "llama3.1"
+# Concurrent requests to Ollama. The server only batches them if it is
+# started with OLLAMA_NUM_PARALLEL >= this value.
+MAX_WORKERS = 16
+UPDATE_BATCH_SIZE = 500
+
+# Constant instructions go in the system message so every request shares the
+# same prefix and the server can reuse its KV cache instead of re-prefilling it.
+SYSTEM_PROMPT = """You are an expert medical editor.
+
+TASK: Rewrite the medical procedure given by the user into a clean Title and a Patient-Friendly Description.
+
+INSTRUCTIONS:
+1. **title:** Create a clean, Title-Cased Headline (3-7 words). Remove codes like 'CPT'.
+2. **description:** Write 1-2 sentences explaining what happens to the user ('You'). Simple English.
+
+OUTPUT JSON FORMAT:
+{
+    "title": "Your Title Here",
+    "description": "Your Description Here"
+}"""
 
 # --- Database Setup ---
 engine = create_engine(MAIN_DB_URL, echo=False)
@@ -29,27 +56,54 @@ class CodeDefinition(Base):
     long_description = Column(String) 
 
 # --- AI Resources ---
-print("Loading Search Resources...")
-search_model = SentenceTransformer('all-MiniLM-L6-v2')
-with open(EMBEDDINGS_PATH, 'rb') as f:
-    search_data = pickle.load(f)
-print("Resources Loaded.")
-
-def get_icd_hints(query, top_k=5):
-    if not query: return []
-    query_embedding = search_model.encode(query, convert_to_tensor=True)
-    corpus_embeddings = search_data['embeddings']
-    hits = util.semantic_search(query_embedding, corpus_embeddings, top_k=top_k)[0]
+def load_search_index():
+    """
+    Memory-maps the IVF-PQ index written by create_embeddings.py.
+    Exits if it is missing or older than the embeddings it was built from.
+    """
+    if not os.path.exists(INDEX_PATH) or os.path.getmtime(INDEX_PATH) < os.path.getmtime(EMBEDDINGS_PATH):
+        print(f"Search index {INDEX_PATH} is missing or stale. Run create_embeddings.py first.")
+        sys.exit(1)
+
+    index = faiss.read_index(INDEX_PATH, faiss.IO_FLAG_MMAP)
+    if hasattr(index, "nprobe"):
+        index.nprobe = IVF_NPROBE
+    return index
+
+@functools.cache
+def _load_search_resources():
+    """
+    Loads the encoder, ICD-10 descriptions and search index on first use,
+    so runs with nothing to fix never pay for them.
+    """
+    print("Loading Search Resources...")
+    search_model = load_encoder()
+    check_corpus_backend(search_model, CODES_PATH)
+    search_descriptions = pq.read_table(CODES_PATH, columns=["description"]).column("description").to_pylist()
+    search_index = load_search_index()
+    print("Resources Loaded.")
+    return search_model, search_descriptions, search_index
+
+def encode_queries(queries):
+    """Encodes all query strings in one batched call, L2-normalized for the index."""
+    search_model, _, _ = _load_search_resources()
+    return search_model.encode(queries, batch_size=64, show_progress_bar=True)
+
+def get_icd_hints(query_embedding, top_k=5):
+    """Returns hint lines for a single pre-encoded query (shape: 1 x dim)."""
+    _, search_descriptions, search_index = _load_search_resources()
+    _, indices = search_index.search(query_embedding, top_k)
     
     results = []
-    for hit in hits:
-        idx = hit['corpus_id']
-        results.append(f"- {search_data['descriptions'][idx]}")
+    for idx in indices[0]:
+        if idx < 0: continue # Fewer than top_k neighbours found
+        results.append(f"- {search_descriptions[idx]}")
     return results
 
 def call_llama_json(prompt):
     try:
         response = ollama.chat(model=MODEL_NAME, messages=[
+            {'role': 'system', 'content': SYSTEM_PROMPT},
             {'role': 'user', 'content': prompt},
         ], format='json') # Enforce JSON mode
         return response['message']['content']
@@ -67,60 +121,66 @@ def cleanup_batch():
     ).all()
     
     print(f"Found {len(records)} records to fix.")
+    if not records:
+        session.close()
+        return
     
-    processed_count = 0
+    # 2. Encode every query in one batch, then build all prompts up front
+    queries = [r.source_text or "Medical Procedure" for r in records]
+    query_embeddings = encode_queries(queries)
     
-    for record in tqdm(records):
-        source_text = record.source_text
-        if not source_text: source_text = "Medical Procedure"
+    jobs = []
+    for i, record in enumerate(records):
+        source_text = queries[i]
 
-        # 2. Run AI Pipeline (JSON Mode)
-        hints = get_icd_hints(source_text)
+        hints = get_icd_hints(query_embeddings[i:i+1])
         hints_str = "\n".join(hints)
         
-        prompt = f"""
-        You are an expert medical editor.
-        
-        TASK: Rewrite this medical procedure into a clean Title and a Patient-Friendly Description.
-        
-        INPUT: "{source_text}"
-        
-        CONTEXT CLUES:
-        {hints_str}
-        
-        INSTRUCTIONS:
-        1. **title:** Create a clean, Title-Cased Headline (3-7 words). Remove codes like 'CPT'.
-        2. **description:** Write 1-2 sentences explaining what happens to the user ('You'). Simple English.
-        
-        OUTPUT JSON FORMAT:
-        {{
-            "title": "Your Title Here",
-            "description": "Your Description Here"
-        }}
-        """
+        # Only the per-record part varies; the instructions live in SYSTEM_PROMPT
+        prompt = f'INPUT: "{source_text}"\n\nCONTEXT CLUES:\n{hints_str}'
+        jobs.append((record, prompt))
+    
+    processed_count = 0
+    updates = []
+    
+    # 3. Run AI Pipeline (JSON Mode) concurrently so the server can batch requests.
+    # Only the main thread touches the session.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        future_to_record = {
+            executor.submit(call_llama_json, prompt): record
+            for record, prompt in jobs
+        }
         
-        response_json = call_llama_json(prompt)
-        if not response_json:
-            continue
-            
-        try:
-            data = json.loads(response_json)
-            title = data.get("title", "Unknown Procedure")
-            desc = data.get("description", "No description available.")
+        for future in tqdm(as_completed(future_to_record), total=len(future_to_record)):
+            record = future_to_record[future]
+            response_json = future.result()
+            if not response_json:
+                continue
+                
+            try:
+                data = json.loads(response_json)
+                title = data.get("title", "Unknown Procedure")
+                desc = data.get("description", "No description available.")
+                
+                # 4. Buffer the update instead of dirtying the ORM object
+                updates.append({
+                    'code': record.code,
+                    'generated_title': title,
+                    'generated_description': desc,
+                })
+                processed_count += 1
+            except json.JSONDecodeError:
+                print(f"JSON Error for {record.code}")
+                continue
             
-            # 3. Update DB
-            record.generated_title = title
-            record.generated_description = desc
-            
-            processed_count += 1
-        except json.JSONDecodeError:
-            print(f"JSON Error for {record.code}")
-            continue
-        
-        # Commit every 10 items
-        if processed_count % 10 == 0:
-            session.commit()
+            # Flush in bulk every UPDATE_BATCH_SIZE items
+            if len(updates) >= UPDATE_BATCH_SIZE:
+                session.bulk_update_mappings(CodeDefinition, updates)
+                session.commit()
+                updates.clear()
             
+    if updates:
+        session.bulk_update_mappings(CodeDefinition, updates)
     session.commit()
     session.close()
     print("Cleanup processing complete!")
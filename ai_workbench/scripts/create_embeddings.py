@@ -1,15 +1,26 @@
-import pickle
 import os
 import numpy as np
+import faiss
+import pyarrow as pa
+import pyarrow.parquet as pq
 from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy import Column, String
-from sentence_transformers import SentenceTransformer
+from encoder import BACKEND_METADATA_KEY, load_encoder
 
 # --- Configuration ---
 DB_PATH = "ai_workbench/db/medical_knowledge.db"
 DB_URL = f"sqlite:///{DB_PATH}"
-EMBEDDINGS_PATH = "ai_workbench/db/icd10_embeddings.pkl"
+EMBEDDINGS_PATH = "ai_workbench/db/icd10_embeddings.npy"  # float16, row-aligned with CODES_PATH
+CODES_PATH = "ai_workbench/db/icd10_codes.parquet"
+INDEX_PATH = "ai_workbench/db/icd10.faiss"
+
+# IVF-PQ: 256 coarse cells, 48 sub-quantizers x 8 bits = 48 bytes per vector
+# (vs 1536 bytes for float32 at 384 dims)
+IVF_NLIST = 256
+PQ_M = 48
+PQ_NBITS = 8
+MIN_TRAINING_POINTS = IVF_NLIST * 39  # FAISS warns below ~39 points per centroid
 
 # Setup SQLAlchemy (Re-defining model here to keep script standalone)
 engine = create_engine(DB_URL, echo=False)
@@ -21,6 +32,26 @@ class ICD10Definition(Base):
     code = Column(String, primary_key=True)
     description = Column(String)
 
+def build_search_index(embeddings):
+    """
+    Trains a product-quantized IVF index over the normalized embeddings.
+    Small corpora don't have enough points to train it and get an exact flat index instead.
+    """
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    # Normalized vectors make L2 distance rank the same as cosine similarity
+    faiss.normalize_L2(vectors)
+    dim = vectors.shape[1]
+
+    if len(vectors) < MIN_TRAINING_POINTS:
+        print(f"Only {len(vectors)} vectors, using an exact flat index.")
+        index = faiss.IndexFlatL2(dim)
+    else:
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, IVF_NLIST, PQ_M, PQ_NBITS)
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
 def create_embeddings():
     print("--- Starting Embedding Generation ---")
     
@@ -40,23 +71,32 @@ def create_embeddings():
 
     # 2. Load Model
     print("Loading Embedding Model (all-MiniLM-L6-v2)...")
-    # This will download the model on first run
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    # This will download (and for ONNX, export and quantize) the model on first run
+    model = load_encoder()
+    print(f"Encoding with {model.BACKEND}.")
     
     # 3. Encode
+    # The encoder batches descriptions in length order (and restores the original
+    # order), so larger batches cost little extra padding.
     print("Generating Embeddings (this may take a minute)...")
-    embeddings = model.encode(descriptions, show_progress_bar=True)
+    embeddings = model.encode(descriptions, batch_size=128, show_progress_bar=True)
     
     # 4. Save
+    # Embeddings go to a float16 .npy (half the bytes, mmap-able on load);
+    # codes/descriptions go to a Parquet sidecar in the same row order.
     print(f"Saving embeddings to {EMBEDDINGS_PATH}...")
-    data = {
-        "codes": codes,
-        "descriptions": descriptions,
-        "embeddings": embeddings
-    }
+    np.save(EMBEDDINGS_PATH, embeddings.astype(np.float16))
+    
+    print(f"Saving codes to {CODES_PATH}...")
+    # The sidecar also records the encoder backend, so query-side scripts can
+    # tell whether they encode into the same space
+    codes_table = pa.table({"code": codes, "description": descriptions},
+                           metadata={BACKEND_METADATA_KEY: model.BACKEND})
+    pq.write_table(codes_table, CODES_PATH)
     
-    with open(EMBEDDINGS_PATH, 'wb') as f:
-        pickle.dump(data, f)
+    # 5. Build the compressed search index once, so lookups never hold the full matrix
+    print(f"Building IVF-PQ search index at {INDEX_PATH}...")
+    faiss.write_index(build_search_index(embeddings), INDEX_PATH)
         
     print("--- Success! Embeddings saved. ---")
 
@@ -0,0 +1,115 @@
+"""
+Shared sentence encoder for the AI workbench scripts.
+
+Serves all-MiniLM-L6-v2 on the GPU when CUDA is available, otherwise through
+ONNX Runtime with dynamic INT8 quantization.
+The ONNX export + quantization runs once and is cached under ai_workbench/db.
+"""
+
+import os
+import numpy as np
+import pyarrow.parquet as pq
+from tqdm import tqdm
+from transformers import AutoTokenizer
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+# --- Configuration ---
+MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_DIR = "ai_workbench/db/minilm_onnx"
+QUANTIZED_DIR = "ai_workbench/db/minilm_onnx_int8"
+QUANTIZED_FILE = "model_quantized.onnx"
+MAX_SEQ_LENGTH = 256  # Same limit SentenceTransformer uses for this model
+# Parquet schema metadata key recording which BACKEND encoded the ICD-10 corpus
+BACKEND_METADATA_KEY = b"encoder_backend"
+
+def export_quantized_model():
+    """Exports MiniLM to ONNX and writes a dynamically quantized INT8 copy."""
+    print(f"Exporting {MODEL_ID} to ONNX (one-time)...")
+    model = ORTModelForFeatureExtraction.from_pretrained(MODEL_ID, export=True)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
+    model.save_pretrained(ONNX_DIR)
+    tokenizer.save_pretrained(ONNX_DIR)
+
+    print("Quantizing to INT8...")
+    quantizer = ORTQuantizer.from_pretrained(ONNX_DIR)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=QUANTIZED_DIR, quantization_config=qconfig)
+    tokenizer.save_pretrained(QUANTIZED_DIR)
+
+class OnnxEncoder:
+    """Drop-in replacement for SentenceTransformer.encode() on the INT8 model."""
+
+    BACKEND = "ONNX Runtime (INT8)"
+
+    def __init__(self):
+        if not os.path.exists(os.path.join(QUANTIZED_DIR, QUANTIZED_FILE)):
+            export_quantized_model()
+        self.tokenizer = AutoTokenizer.from_pretrained(QUANTIZED_DIR)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(QUANTIZED_DIR, file_name=QUANTIZED_FILE)
+
+    def _encode_batch(self, sentences):
+        inputs = self.tokenizer(sentences, padding=True, truncation=True,
+                                max_length=MAX_SEQ_LENGTH, return_tensors="np")
+        hidden = self.model(**inputs).last_hidden_state
+
+        # Mean pooling over real tokens, then L2 normalize
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences, batch_size=64, show_progress_bar=False):
+        """
+        Encodes a list of strings into L2-normalized float32 embeddings.
+        Sentences are batched in length order to minimize padding, and the
+        output rows are returned in the original order.
+        """
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        embeddings = None
+
+        starts = range(0, len(order), batch_size)
+        for start in tqdm(starts, disable=not show_progress_bar):
+            idx = order[start:start + batch_size]
+            batch_embeddings = self._encode_batch([sentences[i] for i in idx])
+            if embeddings is None:
+                embeddings = np.empty((len(sentences), batch_embeddings.shape[1]), dtype=np.float32)
+            embeddings[idx] = batch_embeddings
+
+        if embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return embeddings
+
+class CudaEncoder:
+    """Runs the stock SentenceTransformer on the GPU with the same encode() contract."""
+
+    BACKEND = "SentenceTransformer on CUDA (fp32)"
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(MODEL_ID, device="cuda")
+
+    def encode(self, sentences, batch_size=64, show_progress_bar=False):
+        embeddings = self.model.encode(sentences, batch_size=batch_size,
+                                       show_progress_bar=show_progress_bar,
+                                       convert_to_numpy=True, normalize_embeddings=True)
+        return embeddings.astype(np.float32)
+
+def load_encoder():
+    """Returns a CudaEncoder when a GPU is available, otherwise the INT8 OnnxEncoder."""
+    import torch
+    if torch.cuda.is_available():
+        print("CUDA detected, encoding on GPU.")
+        return CudaEncoder()
+    return OnnxEncoder()
+
+def check_corpus_backend(encoder, codes_path):
+    """
+    Warns when the corpus in codes_path was encoded by a different backend than
+    encoder (fp32 CUDA vs INT8 ONNX vectors are close, but not the same space).
+    """
+    metadata = pq.read_schema(codes_path).metadata or {}
+    corpus_backend = metadata.get(BACKEND_METADATA_KEY, b"unknown").decode()
+    if corpus_backend != encoder.BACKEND:
+        print(f"Warning: ICD-10 embeddings were built with {corpus_backend}, "
+              f"but queries are encoded with {encoder.BACKEND}. "
+              "Re-run create_embeddings.py on this machine for consistent hints.")
@@ -1,16 +1,23 @@
 import sys
 import os
+import mmap
+import numpy as np
+from numba import njit
 from sqlalchemy import Column, String, create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.orm import declarative_base
+
+# Add project root to python path
+sys.path.append(os.getcwd())
+
+from src.ingest_utils import bulk_load_connection
 
 # --- Configuration ---
 # We use a separate DB for the "Knowledge Base"
 DB_PATH = "ai_workbench/db/medical_knowledge.db"
 DB_URL = f"sqlite:///{DB_PATH}"
 
-# Setup SQLAlchemy
+# Setup SQLAlchemy (schema only; rows are written through sqlite3 directly)
 engine = create_engine(DB_URL, echo=False)
-SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
 # --- Database Model ---
@@ -26,6 +33,72 @@ def init_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     Base.metadata.create_all(bind=engine)
 
+# --- Parsing Kernel ---
+NEWLINE = 10
+SPACE = 32
+TAB = 9
+VTAB = 11
+FORM_FEED = 12
+CARRIAGE_RETURN = 13
+
+@njit(cache=True)
+def _is_space(b):
+    # Same bytes bytes.strip() removes, minus NEWLINE (lines are already split on it)
+    return b == SPACE or b == TAB or b == CARRIAGE_RETURN or b == VTAB or b == FORM_FEED
+
+@njit(cache=True)
+def parse_spans(buf):
+    """
+    Scans a uint8 buffer of "CODE DESCRIPTION" lines.
+    Returns (code_starts, code_ends, desc_starts, desc_ends) byte offsets for
+    every line that has both a code and a non-empty description; lines are
+    whitespace-stripped and split on the FIRST space only.
+    """
+    n = buf.shape[0]
+    max_lines = 1
+    for i in range(n):
+        if buf[i] == NEWLINE:
+            max_lines += 1
+
+    code_starts = np.empty(max_lines, dtype=np.int64)
+    code_ends = np.empty(max_lines, dtype=np.int64)
+    desc_starts = np.empty(max_lines, dtype=np.int64)
+    desc_ends = np.empty(max_lines, dtype=np.int64)
+
+    count = 0
+    line_start = 0
+    for i in range(n + 1):
+        if i < n and buf[i] != NEWLINE:
+            continue
+        start = line_start
+        end = i
+        line_start = i + 1
+
+        while start < end and _is_space(buf[start]):
+            start += 1
+        while end > start and _is_space(buf[end - 1]):
+            end -= 1
+
+        split = start
+        while split < end and buf[split] != SPACE:
+            split += 1
+        if split == end:
+            continue  # Empty line or no description
+
+        desc_start = split + 1
+        while desc_start < end and _is_space(buf[desc_start]):
+            desc_start += 1
+        if desc_start == end:
+            continue
+
+        code_starts[count] = start
+        code_ends[count] = split
+        desc_starts[count] = desc_start
+        desc_ends[count] = end
+        count += 1
+
+    return code_starts[:count], code_ends[:count], desc_starts[:count], desc_ends[:count]
+
 def ingest_icd10(file_path):
     print(f"--- Ingesting ICD-10-PCS from: {file_path} ---")
     
@@ -34,55 +107,41 @@ def ingest_icd10(file_path):
         return
 
     init_db()
-    session = SessionLocal()
     
     count = 0
-    batch_size = 10000
+    batch_size = 50000
     batch = []
+    insert_sql = "INSERT OR REPLACE INTO icd10_definitions (code, description) VALUES (?, ?)"
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
+        # One transaction for the whole file (commits on success, rolls back on error)
+        with bulk_load_connection(DB_PATH) as conn, conn:
+            # mmap the file and find every code/description span in one compiled pass;
+            # Python only touches the data again to decode the final strings.
+            with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                code_starts, code_ends, desc_starts, desc_ends = parse_spans(np.frombuffer(mm, dtype=np.uint8))
                 
-                # The file format is usually: CODE (space) DESCRIPTION
-                # Example: 0PHB04Z Insertion of Internal Fixation Device...
-                # We split on the FIRST space only.
-                parts = line.split(' ', 1)
-                
-                if len(parts) < 2:
-                    continue
+                for i in range(len(code_starts)):
+                    code = mm[code_starts[i]:code_ends[i]].decode('ascii')
+                    desc = mm[desc_starts[i]:desc_ends[i]].decode('utf-8')
                     
-                code = parts[0].strip()
-                desc = parts[1].strip()
-                
-                # Create object (don't add to session yet, we batch insert)
-                def_entry = ICD10Definition(code=code, description=desc)
-                batch.append(def_entry)
-                
-                count += 1
-                
-                # Bulk insert for speed
-                if len(batch) >= batch_size:
-                    session.bulk_save_objects(batch)
-                    session.commit()
-                    batch = []
-                    print(f"Processed {count} codes...")
-
-        # Insert remaining
-        if batch:
-            session.bulk_save_objects(batch)
-            session.commit()
+                    batch.append((code, desc))
+                    count += 1
+                    
+                    # Bulk insert for speed
+                    if len(batch) >= batch_size:
+                        conn.executemany(insert_sql, batch)
+                        batch = []
+                        print(f"Processed {count} codes...")
+
+            # Insert remaining
+            if batch:
+                conn.executemany(insert_sql, batch)
             
         print(f"--- Success! Total ICD-10-PCS Codes Ingested: {count} ---")
         
     except Exception as e:
         print(f"Error during ingestion: {e}")
-        session.rollback()
-    finally:
-        session.close()
 
 if __name__ == "__main__":
     # Default location based on user info
@@ -1,6 +1,8 @@
 import sys
 sys.path.insert(0, '.')
 
+from sqlalchemy import text
+
 from src.database import SessionLocal, Item, Price, CodeDefinition, Base, engine
 
 Base.metadata.create_all(bind=engine)
@@ -150,9 +152,8 @@ CODE_DEFINITIONS = [
     ("85025", "Blood count; complete (CBC), automated and automated differential WBC count", "CBC with auto diff"),
 ]
 
-import random
-
-random.seed(42)
+import numpy as np
+import pandas as pd
 
 PRICE_VARIANCE = {
     "UOFM": 1.15,
@@ -181,55 +182,73 @@ for code, long_desc, short_desc in CODE_DEFINITIONS:
         short_description=short_desc
     )
     db.add(code_def)
+db.commit()
 
-for hospital in HOSPITALS:
-    variance = PRICE_VARIANCE[hospital]
-    
-    for code, code_type, description, setting, base_price in PROCEDURES:
-        if hospital == "CHILDRENS" and setting == "inpatient" and code_type == "DRG":
-            if code in ["766", "775", "59400", "59510"]:
-                continue
-        
-        adjusted_base = base_price * variance * random.uniform(0.92, 1.08)
-        
-        item = Item(
-            code=code,
-            code_type=code_type,
-            description=description,
-            hospital_id=hospital,
-            setting=setting
-        )
-        db.add(item)
-        db.flush()
-        
-        for payer_name, plan in PAYERS:
-            base_discount = PAYER_DISCOUNTS.get(payer_name, 0.65)
-            final_discount = base_discount * random.uniform(0.95, 1.05)
-            
-            if payer_name == "DISCOUNTED_CASH":
-                amount = round(adjusted_base * final_discount, 2)
-            else:
-                amount = round(adjusted_base * final_discount, 2)
-            
-            notes = None
-            if code_type == "DRG" and payer_name not in ["DISCOUNTED_CASH", "Medicare", "Medicaid"]:
-                if random.random() < 0.3:
-                    notes = "Per diem rate may apply for extended stays"
-            
-            if payer_name == "DISCOUNTED_CASH" and base_price > 5000:
-                if random.random() < 0.2:
-                    notes = "Payment plan available"
-            
-            price = Price(
-                item_id=item.id,
-                payer=payer_name,
-                plan=plan,
-                amount=amount,
-                notes=notes
-            )
-            db.add(price)
+# Compute every price in one shot: (hospital, procedure, payer) matrix
+rng = np.random.default_rng(42)
 
-db.commit()
+base_prices = np.array([p[4] for p in PROCEDURES], dtype=float)
+hospital_variance = np.array([PRICE_VARIANCE[h] for h in HOSPITALS])[:, None]
+price_noise = rng.uniform(0.92, 1.08, (len(HOSPITALS), len(PROCEDURES)))
+adjusted_base = base_prices * hospital_variance * price_noise
+
+payer_discounts = np.array([PAYER_DISCOUNTS.get(payer_name, 0.65) for payer_name, _ in PAYERS])
+discount_noise = rng.uniform(0.95, 1.05, (len(HOSPITALS), len(PROCEDURES), len(PAYERS)))
+amounts = np.round(adjusted_base[:, :, None] * payer_discounts * discount_noise, 2)
+
+# One draw per price row decides whether it gets a note
+notes_random = rng.random((len(HOSPITALS), len(PROCEDURES), len(PAYERS)))
+
+# Build both tables as DataFrames with explicit item IDs, then insert each once
+procedures = pd.DataFrame(PROCEDURES, columns=["code", "code_type", "description", "setting", "base_price"])
+payers = pd.DataFrame(PAYERS, columns=["payer", "plan"])
+
+# Children's doesn't list the delivery DRGs
+skip = (
+    (np.array(HOSPITALS) == "CHILDRENS")[:, None]
+    & ((procedures["setting"] == "inpatient")
+       & (procedures["code_type"] == "DRG")
+       & procedures["code"].isin(["766", "775", "59400", "59510"])).to_numpy()
+)
+h_idx, p_idx = np.nonzero(~skip)  # Row-major: hospital, then procedure order
+
+items_df = procedures.iloc[p_idx][["code", "code_type", "description", "setting"]].reset_index(drop=True)
+items_df.insert(0, "id", np.arange(1, len(items_df) + 1))
+items_df.insert(4, "hospital_id", np.array(HOSPITALS)[h_idx])
+
+# Every item gets one price per payer
+n_payers = len(PAYERS)
+item_ids = np.repeat(items_df["id"].to_numpy(), n_payers)
+row_h = np.repeat(h_idx, n_payers)
+row_p = np.repeat(p_idx, n_payers)
+row_y = np.tile(np.arange(n_payers), len(items_df))
+
+is_drg = (procedures["code_type"] == "DRG").to_numpy()[row_p]
+is_cash = (payers["payer"] == "DISCOUNTED_CASH").to_numpy()[row_y]
+is_public = payers["payer"].isin(["DISCOUNTED_CASH", "Medicare", "Medicaid"]).to_numpy()[row_y]
+is_expensive = (procedures["base_price"] > 5000).to_numpy()[row_p]
+roll = notes_random[row_h, row_p, row_y]
+
+notes = np.full(len(item_ids), None, dtype=object)
+notes[is_drg & ~is_public & (roll < 0.3)] = "Per diem rate may apply for extended stays"
+notes[is_cash & is_expensive & (roll < 0.2)] = "Payment plan available"
+
+prices_df = pd.DataFrame({
+    "item_id": item_ids,
+    "payer": payers["payer"].to_numpy()[row_y],
+    "plan": payers["plan"].to_numpy()[row_y],
+    "amount": amounts[row_h, row_p, row_y],
+    "notes": notes,
+})
+
+# Multi-row INSERTs, 500 rows per statement, in one transaction
+with engine.begin() as conn:
+    items_df.to_sql("items", conn, if_exists="append", index=False, method="multi", chunksize=500)
+    prices_df.to_sql("prices", conn, if_exists="append", index=False, method="multi", chunksize=500)
+    if conn.dialect.name == "postgresql":
+        # Explicit ids don't advance the serial sequence; move it past them so
+        # later ORM inserts don't collide with the sample items
+        conn.execute(text("SELECT setval(pg_get_serial_sequence('items', 'id'), (SELECT MAX(id) FROM items))"))
 
 item_count = db.query(Item).count()
 price_count = db.query(Price).count()
@@ -1,13 +1,33 @@
 import subprocess
 import sys
 import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 
-def run_script(script_name, args=[]):
+sys.path.insert(0, '.')
+
+from src.database import Base, Item, Price, engine, init_db
+
+# (script, csv path, hospital id) - each hospital is ingested into its own
+# staging database so they can run in parallel, then merged into hospital.db.
+# With DATABASE_URL set, the hospitals write straight to that server database
+# instead, one hospital at a time (no staging files, no merge); HCPCS definitions
+# still go to the local hospital.db.
+HOSPITAL_INGESTS = [
+    ("scripts/ingest_tall.py", "data/raw/beaumontroyaloak.csv", "BEAUMONT"),
+    ("scripts/ingest_tall.py", "data/raw/childrenshospitalofmichigan_detroit.csv", "CHILDRENS"),
+    ("scripts/ingest_wide.py", "data/raw/universityofmichigan.csv", "UOFM"),
+    ("scripts/ingest_tall.py", "data/raw/henryforddetroit.csv", "HENRYFORD"),
+]
+
+MAX_WORKERS = 4
+
+def run_script(script_name, args=[], env=None):
     """Runs a python script as a subprocess."""
     cmd = [sys.executable, script_name] + args
     print(f"\n>>> Running: {' '.join(cmd)}")
     try:
-        result = subprocess.run(cmd, check=True)
+        result = subprocess.run(cmd, check=True, env=env)
         if result.returncode == 0:
             print(f">>> {script_name} completed successfully.")
         else:
@@ -18,44 +38,108 @@ def run_script(script_name, args=[]):
         return False
     return True
 
+def staging_db_path(hospital_id):
+    return f"hospital_{hospital_id}.db"
+
+def run_hospital_ingest(script_name, csv_path, hospital_id, use_staging=True):
+    """Runs one hospital ingest against a fresh staging database (or the server database)."""
+    if not use_staging:
+        # DATABASE_URL wins over STAGING_DB, so the script writes to the server directly
+        return run_script(script_name, [csv_path, hospital_id])
+    staging_db = staging_db_path(hospital_id)
+    if os.path.exists(staging_db):
+        os.remove(staging_db)
+    env = dict(os.environ, STAGING_DB=staging_db)
+    return run_script(script_name, [csv_path, hospital_id], env=env)
+
+def reset_server_tables():
+    """Empties items/prices on the DATABASE_URL server so a re-run doesn't insert every hospital twice."""
+    print(f"Resetting items/prices on {engine.url.render_as_string(hide_password=True)}")
+    Base.metadata.drop_all(bind=engine, tables=[Price.__table__, Item.__table__])
+    init_db()
+
+def merge_staging_dbs(db_file, hospital_ids):
+    """
+    Copies items/prices from every staging database into db_file.
+    Item IDs are shifted past the current max so they never collide.
+    """
+    print(f"\n>>> Merging {len(hospital_ids)} staging databases into {db_file}...")
+    conn = sqlite3.connect(db_file)
+    try:
+        # ATTACH/DETACH must happen outside the insert transaction
+        aliases = []
+        for i, hospital_id in enumerate(hospital_ids):
+            alias = f"staging{i}"
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (staging_db_path(hospital_id),))
+            aliases.append(alias)
+
+        with conn:
+            for alias in aliases:
+                offset = conn.execute("SELECT COALESCE(MAX(id), 0) FROM items").fetchone()[0]
+                conn.execute(f"""
+                    INSERT INTO items (id, code, code_type, description, hospital_id, setting)
+                    SELECT id + ?, code, code_type, description, hospital_id, setting FROM {alias}.items
+                """, (offset,))
+                conn.execute(f"""
+                    INSERT INTO prices (item_id, payer, plan, amount, notes)
+                    SELECT item_id + ?, payer, plan, amount, notes FROM {alias}.prices
+                """, (offset,))
+
+        for alias in aliases:
+            conn.execute(f"DETACH DATABASE {alias}")
+    finally:
+        conn.close()
+
+    for hospital_id in hospital_ids:
+        os.remove(staging_db_path(hospital_id))
+    print(">>> Merge complete.")
+
 def main():
     print("=== STARTING FULL INGESTION PIPELINE ===")
     
     # 1. Reset Database
     db_file = "hospital.db"
-    if os.path.exists(db_file):
-        print(f"Removing existing database: {db_file}")
-        os.remove(db_file)
+    use_staging = not os.environ.get("DATABASE_URL")
+    if use_staging:
+        if os.path.exists(db_file):
+            print(f"Removing existing database: {db_file}")
+            os.remove(db_file)
+        init_db()
+    else:
+        reset_server_tables()
     
-    # 2. Ingest HCPCS Definitions
+    # 2. Run HCPCS definitions alongside the hospital ingests.
+    # HCPCS only touches code_definitions in the local hospital.db (also with
+    # DATABASE_URL set, see ingest_hcpcs_definitions.py); hospitals write staging DBs.
     # The script expects the file path as an argument or uses a default
     # We'll assume the default path inside the script works, or pass it explicitly if needed.
-    if not run_script("scripts/ingest_hcpcs_definitions.py"):
-        print("Pipeline stopped due to error.")
-        return
-
-    # 3. Ingest Beaumont (Tall)
-    if not run_script("scripts/ingest_tall.py", ["data/raw/beaumontroyaloak.csv", "BEAUMONT"]):
-        print("Pipeline stopped due to error.")
-        return
-
-    # 4. Ingest Children's (Tall)
-    if not run_script("scripts/ingest_tall.py", ["data/raw/childrenshospitalofmichigan_detroit.csv", "CHILDRENS"]):
-        print("Pipeline stopped due to error.")
-        return
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS + 1) as executor:
+        hcpcs_future = executor.submit(run_script, "scripts/ingest_hcpcs_definitions.py")
+        if use_staging:
+            hospital_futures = [
+                executor.submit(run_hospital_ingest, script, csv_path, hospital_id)
+                for script, csv_path, hospital_id in HOSPITAL_INGESTS
+            ]
+            hospital_results = [f.result() for f in hospital_futures]
+        else:
+            # All hospitals share one server prices table, so load them one at a
+            # time rather than have concurrent bulk loads fight over its locks.
+            hospital_results = []
+            for script, csv_path, hospital_id in HOSPITAL_INGESTS:
+                hospital_results.append(run_hospital_ingest(script, csv_path, hospital_id, use_staging=False))
+                if not hospital_results[-1]:
+                    break
+        results = [hcpcs_future.result()] + hospital_results
 
-    # 5. Ingest UofM (Wide)
-    if not run_script("scripts/ingest_wide.py", ["data/raw/universityofmichigan.csv", "UOFM"]):
+    if not all(results):
         print("Pipeline stopped due to error.")
         return
 
-    # 6. Ingest Henry Ford (Tall)
-    if not run_script("scripts/ingest_tall.py", ["data/raw/henryforddetroit.csv", "HENRYFORD"]):
-        print("Pipeline stopped due to error.")
-        return
+    # 3. Merge staging databases into the main database (server runs already wrote there)
+    if use_staging:
+        merge_staging_dbs(db_file, [hospital_id for _, _, hospital_id in HOSPITAL_INGESTS])
 
     print("\n=== ALL INGESTION TASKS COMPLETED ===")
 
 if __name__ == "__main__":
     main()
-
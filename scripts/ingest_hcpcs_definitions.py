@@ -1,12 +1,21 @@
 import sys
 import os
+from collections import defaultdict
 from sqlalchemy import Column, String, create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.orm import declarative_base
 
-# Define the database file (must match the main app)
-DB_URL = "sqlite:///hospital.db"
+# Add project root to python path
+sys.path.append(os.getcwd())
+
+from src.ingest_utils import bulk_load_connection
+
+# Define the database file (must match the main app).
+# Always the local SQLite file, even when DATABASE_URL points the rest of the
+# pipeline at a server: the bulk upsert below goes through sqlite3 directly.
+# With a server database, code_definitions has to be copied there separately.
+DB_PATH = "hospital.db"
+DB_URL = f"sqlite:///{DB_PATH}"
 engine = create_engine(DB_URL, echo=False)
-SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
 # Define the CodeDefinition model
@@ -21,11 +30,19 @@ def init_definitions_table():
     print("--- Creating Code Definitions Table ---")
     Base.metadata.create_all(bind=engine)
 
+# Upsert keeps any AI-generated columns on codes that already exist
+UPSERT_SQL = """
+    INSERT INTO code_definitions (code, long_description, short_description)
+    VALUES (?, ?, ?)
+    ON CONFLICT(code) DO UPDATE SET
+        long_description = excluded.long_description,
+        short_description = excluded.short_description
+"""
+
 def ingest_hcpcs_definitions(file_path):
     print(f"--- Ingesting HCPCS Definitions from: {file_path} ---")
     
     init_definitions_table()
-    session = SessionLocal()
     
     try:
         # Read the fixed-width text file
@@ -34,25 +51,10 @@ def ingest_hcpcs_definitions(file_path):
         # Long Desc: 12-91 (11-91 in slice)
         # Short Desc: 92-119 (91-119 in slice)
         
-        count = 0
-        current_code = None
-        current_long_desc_parts = []
-        current_short_desc = None
-
-        def save_current_code():
-            nonlocal count
-            if current_code:
-                full_long_desc = " ".join(current_long_desc_parts)
-                def_entry = CodeDefinition(
-                    code=current_code,
-                    long_description=full_long_desc,
-                    short_description=current_short_desc
-                )
-                session.merge(def_entry)
-                count += 1
-                if count % 1000 == 0:
-                    session.commit()
-                    print(f"Processed {count} definitions...")
+        # Single pass: gather long description chunks per code (continuation
+        # lines repeat the code) and keep the first short description seen.
+        long_parts = defaultdict(list)
+        short_by_code = {}
 
         with open(file_path, 'r', encoding='iso-8859-1') as f:
             for line in f:
@@ -69,30 +71,21 @@ def ingest_hcpcs_definitions(file_path):
                 if not code:
                     continue
                 
-                if code != current_code:
-                    # Save previous if exists
-                    save_current_code()
-                    
-                    # Start new
-                    current_code = code
-                    current_long_desc_parts = [long_desc_chunk] if long_desc_chunk else []
-                    current_short_desc = short_desc_chunk
-                else:
-                    # Continuation
-                    if long_desc_chunk:
-                        current_long_desc_parts.append(long_desc_chunk)
-                    # Usually short_desc is only on first line, so we keep the first one
+                parts = long_parts[code]
+                if long_desc_chunk:
+                    parts.append(long_desc_chunk)
+                # Usually short_desc is only on first line, so we keep the first one
+                short_by_code.setdefault(code, short_desc_chunk)
+        
+        rows = [(code, " ".join(parts), short_by_code[code]) for code, parts in long_parts.items()]
         
-        # Save final entry
-        save_current_code()
-        session.commit()
-        print(f"--- Completed. Total Definitions: {count} ---")
+        # One executemany, one transaction (rolled back on error)
+        with bulk_load_connection(DB_PATH) as conn, conn:
+            conn.executemany(UPSERT_SQL, rows)
+        print(f"--- Completed. Total Definitions: {len(rows)} ---")
         
     except Exception as e:
         print(f"Error: {e}")
-        session.rollback()
-    finally:
-        session.close()
 
 if __name__ == "__main__":
     # Default path if not provided
@@ -4,44 +4,372 @@ import os
 # Add project root to python path
 sys.path.append(os.getcwd())
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from src.database import SessionLocal, Item, Price, init_db
+from src.database import engine, Item, Price, init_db
+from src.ingest_utils import (
+    FORMULA_RE, detect_encoding, read_csv_batches, column_values, column_series, code_priorities
+)
 
-def parse_price(price_str):
+# Prices are sent to the DB as multi-row INSERTs of this many rows
+PRICE_BATCH_SIZE = 10000
+
+# Core INSERTs built once and reused for every batch. Going through the
+# Connection skips the ORM bulk-insert layer that session.execute() adds.
+ITEM_INSERT = Item.__table__.insert().returning(Item.__table__.c.id, sort_by_parameter_order=True)
+PRICE_INSERT = Price.__table__.insert()
+
+# Rows per chunk when re-reading the cached Parquet copy
+PARQUET_BATCH_ROWS = 250000
+
+# What a price cell must look like (after stripping $ and ,) to be cast to a float
+NUMBER_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+NULL_STRING = pa.scalar(None, pa.string())
+NULL_FLOAT = pa.scalar(None, pa.float64())
+
+# The only columns that go through pandas (code selection and item grouping);
+# prices stay in Arrow
+ITEM_COLUMNS = ['description', 'setting', 'billing_class'] + [
+    col for i in range(1, 6) for col in (f'code|{i}', f'code|{i}|type')
+]
+
+def iter_tall_csv(file_path, header_row=2):
     """
-    Returns tuple: (price_value, notes_str)
+    Yields the file as Arrow table chunks.
+    Reads the Parquet copy next to the CSV when it is newer than the CSV;
+    otherwise parses the CSV and writes that copy (zstd) while streaming,
+    so re-running an ingest skips the CSV parse entirely.
     """
-    if pd.isna(price_str) or price_str == '' or str(price_str).strip() == '':
-        return None, None
+    cached_path = file_path + '.parquet'
+    if os.path.exists(cached_path) and os.path.getmtime(cached_path) >= os.path.getmtime(file_path):
+        print(f"Using cached Parquet copy: {cached_path}")
+        for batch in pq.ParquetFile(cached_path).iter_batches(batch_size=PARQUET_BATCH_ROWS):
+            yield pa.Table.from_batches([batch])
+        return
 
-    price_str_clean = str(price_str).strip()
-
-    # CHECK 1: Text Formula (starts with Formula or contains alphabetical chars beyond reasonable typos)
-    # Heuristic: If it contains 'Formula', we capture it as a note.
-    if 'Formula' in price_str_clean or 'algorithm' in price_str_clean.lower():
-        return None, price_str_clean
+    encoding = detect_encoding(file_path)
 
+    # Written under a temp name and only renamed once the whole file was read,
+    # so an interrupted run never leaves a truncated cache behind
+    tmp_path = cached_path + '.tmp'
+    writer = None
+    completed = False
     try:
-        # Remove $ and , and convert to float
-        clean = price_str_clean.replace('$', '').replace(',', '')
-        val = float(clean)
+        for batch in read_csv_batches(file_path, header_row=header_row, encoding=encoding):
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, batch.schema, compression='zstd')
+            writer.write_batch(batch)
+            yield pa.Table.from_batches([batch])
+        completed = True
+    finally:
+        if writer is not None:
+            writer.close()
+            if completed:
+                os.replace(tmp_path, cached_path)
+            else:
+                os.remove(tmp_path)
+
+def resolve_codes(df):
+    """
+    Vectorized code selection for every row at once.
+    Candidates are code|1 as-is followed by each valid code|i; the first one with
+    the lowest priority wins (same as the old strict '<' scan), picked with one argmin.
+    Then 5-character codes are normalized to CPT (digits) or HCPCS (leading letter).
+    Returns (final_codes, final_types) object arrays.
+    """
+    n = len(df)
+    code_cols = [f'code|{i}' for i in range(1, 6)]
+    type_cols = [f'code|{i}|type' for i in range(1, 6)]
+    present = [i for i in range(5) if code_cols[i] in df.columns and type_cols[i] in df.columns]
+
+    codes = np.empty((n, len(present) + 1), dtype=object)
+    types = np.empty((n, len(present) + 1), dtype=object)
+    priorities = np.empty((n, len(present) + 1), dtype=np.int8)
+
+    # Column 0: code|1 exactly as listed (the starting point of the old scan)
+    codes[:, 0] = column_values(df, 'code|1', 'UNKNOWN')
+    types[:, 0] = column_values(df, 'code|1|type', 'UNKNOWN')
+    priorities[:, 0] = code_priorities(types[:, 0])
+
+    if present:
+        codes[:, 1:] = df[[code_cols[i] for i in present]].to_numpy(dtype=object)
+        types[:, 1:] = df[[type_cols[i] for i in present]].to_numpy(dtype=object)
+
+        # VALIDATION: Ignore bogus HCPCS/CPT codes
+        code_lengths = np.char.str_len(np.char.strip(codes[:, 1:].astype(str)))
+        bogus = np.isin(types[:, 1:], ['CPT', 'HCPCS']) & (code_lengths != 5)
+        types[:, 1:][bogus] = 'Local'
+
+        candidate_prio = code_priorities(types[:, 1:].ravel()).reshape(n, len(present))
+        # Rows missing a code or type can never win
+        missing = pd.isna(codes[:, 1:]) | pd.isna(types[:, 1:])
+        candidate_prio[missing] = 127
+        priorities[:, 1:] = candidate_prio
+
+    winners = priorities.argmin(axis=1)[:, None]
+    final_codes = np.take_along_axis(codes, winners, axis=1).ravel()
+    final_types = np.take_along_axis(types, winners, axis=1).ravel()
+
+    # NORMALIZE: Force CPT vs HCPCS based on format
+    # CPT: 5 digits (numeric)
+    # HCPCS: Letter + 4 digits (or similar)
+    code_series = pd.Series(final_codes, dtype=object)
+    five_chars = code_series.str.strip().str.len().eq(5).to_numpy()
+    is_digits = code_series.str.isdigit().eq(True).to_numpy()
+    starts_alpha = code_series.str[0].str.isalpha().eq(True).to_numpy()
+    final_types = np.where(five_chars & is_digits, 'CPT',
+                           np.where(five_chars & starts_alpha, 'HCPCS', final_types))
+
+    return final_codes, final_types
+
+def arrow_column(table, col):
+    """Returns a column as one Arrow string array, or all nulls if the column is missing."""
+    if col in table.column_names:
+        return table.column(col).combine_chunks()
+    return pa.nulls(table.num_rows, pa.string())
+
+def non_empty(text):
+    """Null-safe mask of cells holding some text."""
+    return pc.fill_null(pc.not_equal(text, ''), False)
+
+def parse_price_array(column):
+    """
+    Parses a whole price column (an Arrow string array) at once with Arrow compute kernels.
+    Returns (values, notes) Arrow arrays, null where absent:
+    numbers (with $ and , stripped) become values, formula or other text becomes a note,
+    and blanks and placeholder prices (>= 99999999) become neither.
+    Cells are trimmed first, so a whitespace-only cell is blank here, unlike
+    ingest_wide's parse_price_series, which keeps it as an empty note.
+    """
+    text = pc.utf8_trim_whitespace(column)
+    present = non_empty(text)
+
+    # Text formulas are kept as notes (one regex scan per column)
+    is_formula = pc.fill_null(pc.match_substring_regex(text, FORMULA_RE.pattern), False)
+
+    # Remove $ and , and cast to float; only cells that look like a number are cast
+    cleaned = pc.replace_substring_regex(text, pattern=r'[\$,]', replacement='')
+    parsed = pc.and_(pc.invert(is_formula),
+                     pc.fill_null(pc.match_substring_regex(cleaned, NUMBER_PATTERN), False))
+    vals = pc.cast(pc.if_else(parsed, cleaned, NULL_STRING), pa.float64())
+
+    # FILTER: Ignore placeholder prices often found in Children's data
+    keep_value = pc.and_(parsed, pc.less(vals, 99999999))
+    keep_note = pc.and_(present, pc.invert(parsed))
+
+    values = pc.if_else(keep_value, vals, NULL_FLOAT)
+    notes = pc.if_else(keep_note, text, NULL_STRING)
+    return values, notes
+
+def has_price(values, notes):
+    """Rows where the price column produced a value or a note."""
+    return pc.or_(pc.is_valid(values), pc.is_valid(notes))
+
+def with_location(notes, location_info):
+    """Appends the location info to each note, or uses it as the note when there is none."""
+    has_location = non_empty(location_info)
+    combined = pc.binary_join_element_wise(notes, location_info, ' | ')
+    return pc.if_else(pc.and_(has_location, pc.is_valid(notes)), combined,
+                      pc.if_else(has_location, location_info, notes))
+
+def needs_sibling_note(values, notes):
+    """Rows with no price and no usable note (or only a placeholder) look for a sibling column."""
+    placeholder = pc.fill_null(pc.match_substring(notes, 'Placeholder'), True)
+    return pc.and_(pc.is_null(values), placeholder)
+
+def with_sibling_note(notes, missing, sibling, label):
+    """
+    Fills rows flagged in `missing` with '<label>: <sibling text>' where the sibling has text.
+    Returns (notes, missing) with the filled rows cleared from `missing`.
+    """
+    sibling = pc.utf8_trim_whitespace(sibling)
+    use = pc.and_(missing, non_empty(sibling))
+    notes = pc.if_else(use, pc.binary_join_element_wise(f"{label}: ", sibling, ''), notes)
+    return notes, pc.and_(missing, pc.invert(use))
+
+def parse_payer_columns(table):
+    """
+    Children's Format: "standard_charge|Payer Name|Plan Name|negotiated_dollar".
+    Parses each payer dollar column once and returns a list of
+    (payer, plan, values, notes) with values/notes aligned to the rows of the table.
+    """
+    payer_columns = []
+    for col in table.column_names:
+        if 'negotiated_dollar' not in col and 'estimated_amount' not in col:
+            continue
+
+        # Parse Payer/Plan from column header
+        # Example: standard_charge|United Healthcare|UnitedHealthcareNewBusiness|negotiated_dollar
+        # Sometimes it might be: estimated_amount|PAYER|PLAN
+        parts = col.split('|')
+        if len(parts) < 3:
+            continue
+        payer_name = parts[1]
+        plan_name = parts[2]
+        # Clean up if last part is 'negotiated_dollar' etc.
+        if plan_name in ['negotiated_dollar', 'estimated_amount', 'negotiated_percentage']:
+            plan_name = None
+
+        # The dollar column itself sometimes contains the "Formula..." string in this dataset.
+        values, notes = parse_price_array(arrow_column(table, col))
+
+        # Sibling extraction: replace 'negotiated_dollar' with 'negotiated_algorithm', 'methodology', ...
+        if parts[-1] in ['negotiated_dollar', 'estimated_amount']:
+            missing = needs_sibling_note(values, notes)
+            for suffix in ['negotiated_algorithm', 'methodology', 'negotiated_percentage']:
+                sibling_col = "|".join(parts[:-1] + [suffix])
+                if sibling_col not in table.column_names:
+                    continue
+                notes, missing = with_sibling_note(notes, missing, arrow_column(table, sibling_col), suffix)
+
+        payer_columns.append((payer_name, plan_name, values, notes))
+    return payer_columns
+
+def ingest_chunk(session, table, hospital_id, item_cache, price_dedupe_cache):
+    """
+    Inserts the items and prices for one chunk of rows.
+    Only the code/description columns are converted to pandas; the price
+    columns are parsed in Arrow and turned into Python lists at the very end.
+    item_cache and price_dedupe_cache carry over between chunks.
+    """
+    # Plain dicts flushed in bulk instead of one ORM object per price
+    price_rows = []
+    conn = session.connection()
+    df = table.select([col for col in ITEM_COLUMNS if col in table.column_names]).to_pandas()
+    
+    # 1. Smart Code Extraction (Standard Logic), vectorized over all rows
+    final_codes, final_types = resolve_codes(df)
+    descriptions = column_values(df, 'description', 'No Description')
+    
+    # Prefer 'setting' column (e.g. 'outpatient'), fallback to 'billing_class'
+    setting = column_series(df, 'setting')
+    settings = np.where((setting.isna() | setting.eq('')).to_numpy(),
+                        column_values(df, 'billing_class', 'UNKNOWN'),
+                        setting.to_numpy(dtype=object))
+    
+    # Resolve Items: one integer group per unique (code, description, setting).
+    # ngroup(sort=False) numbers groups in order of first appearance, so each
+    # item keeps its first row's code type and IDs follow file order.
+    item_keys = ['code', 'description', 'setting']
+    items = pd.DataFrame({
+        'code': final_codes,
+        'code_type': final_types,
+        'description': descriptions,
+        'setting': settings,
+    }, dtype=object)
+    group_ids = items.groupby(item_keys, sort=False, dropna=False).ngroup().to_numpy()
+    _, first_rows = np.unique(group_ids, return_index=True)
+    unique_items = items.iloc[first_rows].reset_index(drop=True)
+    # Hashable keys for the cross-chunk cache, with every missing value as None
+    # (one vectorized null mask instead of a pd.isna call per cell)
+    key_frame = unique_items[item_keys]
+    unique_keys = list(key_frame.where(key_frame.notna(), None).itertuples(index=False, name=None))
+    
+    # Only items not seen in an earlier chunk are inserted, in one statement
+    is_new = np.array([key not in item_cache for key in unique_keys], dtype=bool)
+    if is_new.any():
+        new_items = unique_items[is_new].assign(hospital_id=hospital_id)
+        new_ids = conn.execute(
+            ITEM_INSERT,
+            new_items.to_dict('records')
+        ).scalars().all()
+        new_keys = [key for key, new in zip(unique_keys, is_new) if new]
+        item_cache.update(zip(new_keys, new_ids))
+    
+    # Per-row item ID is a plain array index by group, no per-row hashing
+    group_to_item_id = np.array([item_cache[key] for key in unique_keys], dtype=np.int64)
+    item_ids = group_to_item_id[group_ids].tolist()
+    
+    # 2. Branch A prices (Beaumont Style): payer/plan in columns
+    payers = arrow_column(table, 'payer_name').to_pylist()
+    plans = arrow_column(table, 'plan_name').to_pylist()
+    has_payer = pc.is_valid(arrow_column(table, 'payer_name'))
+    
+    # Empty cells are already null, so coalesce falls back to the estimate exactly where the old '' check did
+    price_str = pc.coalesce(arrow_column(table, 'standard_charge|negotiated_dollar'),
+                            arrow_column(table, 'estimated_amount'))
+    payer_vals, payer_notes = parse_price_array(price_str)
+    
+    # Sibling extraction for Beaumont (Tall Format)
+    payer_notes, _ = with_sibling_note(payer_notes, needs_sibling_note(payer_vals, payer_notes),
+                                       arrow_column(table, 'standard_charge|negotiated_algorithm'), 'Algorithm')
+    has_payer_price = pc.and_(has_payer, has_price(payer_vals, payer_notes))
+    
+    # 3. Gross / Cash Prices (Common to both usually)
+    # Capture location/notes from the last column to distinguish duplicates
+    location_info = pc.utf8_trim_whitespace(
+        pc.replace_substring(arrow_column(table, 'additional_generic_notes'), 'Gross Charge Type:', ''))
+    gross_vals, gross_notes = parse_price_array(arrow_column(table, 'standard_charge|gross'))
+    has_gross = has_price(gross_vals, gross_notes)
+    gross_notes = with_location(gross_notes, location_info)
+    
+    cash_vals, cash_notes = parse_price_array(arrow_column(table, 'standard_charge|discounted_cash'))
+    has_cash = has_price(cash_vals, cash_notes)
+    cash_notes = with_location(cash_notes, location_info)
+    
+    # Branch B prices (Children's Style): payers defined by columns, only for rows without a payer_name
+    # One vectorized pass per payer column instead of scanning every column on every row
+    payerless_rows = pc.invert(has_payer)
+    for payer_name, plan_name, col_vals, col_notes in parse_payer_columns(table):
+        emit = pc.and_(payerless_rows, has_price(col_vals, col_notes)).to_numpy(zero_copy_only=False)
+        col_vals = col_vals.to_pylist()
+        col_notes = col_notes.to_pylist()
+        price_rows.extend(
+            {'item_id': item_ids[i], 'payer': payer_name, 'plan': plan_name, 'amount': col_vals[i], 'notes': col_notes[i]}
+            for i in np.flatnonzero(emit)
+        )
+        if len(price_rows) >= PRICE_BATCH_SIZE:
+            conn.execute(PRICE_INSERT, price_rows)
+            price_rows = []
+    
+    # Plain lists index faster than numpy scalars, and local names skip the
+    # global/attribute lookups on every iteration
+    has_payer_price = has_payer_price.to_pylist()
+    has_gross = has_gross.to_pylist()
+    has_cash = has_cash.to_pylist()
+    payer_vals, payer_notes = payer_vals.to_pylist(), payer_notes.to_pylist()
+    gross_vals, gross_notes = gross_vals.to_pylist(), gross_notes.to_pylist()
+    cash_vals, cash_notes = cash_vals.to_pylist(), cash_notes.to_pylist()
+    append_price = price_rows.append
+    seen_prices = price_dedupe_cache
+    mark_seen = price_dedupe_cache.add
+    
+    for i in range(table.num_rows):
+        item_id = item_ids[i]
+
+        # Branch A: If 'payer_name' column exists (Beaumont Style)
+        if has_payer_price[i]:
+            append_price({'item_id': item_id, 'payer': payers[i], 'plan': plans[i], 'amount': payer_vals[i], 'notes': payer_notes[i]})
+
+        # B. Gross / Cash Prices, deduplicated per item
+        if has_gross[i]:
+             dedupe_key = (item_id, 'GROSS', gross_vals[i], gross_notes[i])
+             if dedupe_key not in seen_prices:
+                 append_price({'item_id': item_id, 'payer': "GROSS", 'plan': None, 'amount': gross_vals[i], 'notes': gross_notes[i]})
+                 mark_seen(dedupe_key)
+
+        if has_cash[i]:
+             dedupe_key = (item_id, 'DISCOUNTED_CASH', cash_vals[i], cash_notes[i])
+             if dedupe_key not in seen_prices:
+                 append_price({'item_id': item_id, 'payer': "DISCOUNTED_CASH", 'plan': None, 'amount': cash_vals[i], 'notes': cash_notes[i]})
+                 mark_seen(dedupe_key)
         
-        # FILTER: Ignore placeholder prices often found in Children's data
-        if val >= 99999999:
-            # Return None for price, but we might use this signal to look for sibling columns later
-            return None, None
-            
-        return val, None
-    except:
-        # If it fails to parse as float, treat as note string if non-empty
-        return None, price_str_clean
+        if len(price_rows) >= PRICE_BATCH_SIZE:
+            conn.execute(PRICE_INSERT, price_rows)
+            price_rows.clear()  # Keep the same list so append_price stays bound to it
+
+    if price_rows:
+        conn.execute(PRICE_INSERT, price_rows)
 
 def ingest_tall_csv(file_path, hospital_id="BEAUMONT"):
     print(f"--- Starting Tall CSV Ingestion for: {file_path} (Hospital: {hospital_id}) ---")
     
     init_db()
-    session = SessionLocal()
 
     try:
         print("Reading CSV... (this may take a moment)")
@@ -51,18 +379,6 @@ def ingest_tall_csv(file_path, hospital_id="BEAUMONT"):
         # So we can try header=2 first. If columns look wrong, maybe try others?
         # For now, both seem to be header=2.
         
-        try:
-            df = pd.read_csv(file_path, header=2, dtype=str, encoding='utf-8')
-        except UnicodeDecodeError:
-            print("UTF-8 failed. Trying ISO-8859-1...")
-            df = pd.read_csv(file_path, header=2, dtype=str, encoding='iso-8859-1')
-            
-        # Verify we have expected columns
-        if 'code|1' not in df.columns and 'description' not in df.columns:
-            print("WARNING: Header detection might be wrong. Columns found:", df.columns[:5])
-        
-        print(f"Loaded {len(df)} rows. Processing...")
-
         # Cache to avoid creating duplicate items for every payer row
         # Key: (code, description, setting) -> item_id
         item_cache = {}
@@ -73,215 +389,46 @@ def ingest_tall_csv(file_path, hospital_id="BEAUMONT"):
         
         count = 0
         
-        for index, row in df.iterrows():
-            # 1. Smart Code Extraction (Standard Logic)
-            final_code = row.get('code|1', 'UNKNOWN')
-            final_type = row.get('code|1|type', 'UNKNOWN')
+        # 2. Stream the file in blocks inside ONE transaction: a single commit
+        # at the end instead of a WAL sync per batch, and a failed load leaves nothing behind.
+        # Everything goes through bulk insert() statements, so skip the unit-of-work
+        # autoflush before each one and the expire-all at commit.
+        with Session(bind=engine, autoflush=False, expire_on_commit=False) as session, session.begin():
+            # Loading into an empty SQLite prices table (a fresh staging DB): secondary
+            # indexes are dropped for the load and rebuilt once at the end, instead of
+            # being updated on every inserted row. DDL is transactional in SQLite, so a
+            # failed load restores them on rollback. With rows already there the rebuild
+            # would cover every hospital's prices, and on a server database (Postgres)
+            # DROP INDEX locks prices against all readers/writers for the whole load,
+            # so the indexes are kept and updated as usual.
+            conn = session.connection()
+            rebuild_indexes = (conn.dialect.name == "sqlite"
+                               and conn.execute(select(Price.id).limit(1)).first() is None)
+            if rebuild_indexes:
+                for index in Price.__table__.indexes:
+                    index.drop(bind=conn, checkfirst=True)
             
-            priority_map = {
-                'CPT': 1,
-                'HCPCS': 2,
-                'MS-DRG': 3,
-                'APR-DRG': 4,
-                'NDC': 5,
-                'CDM': 99,
-                'Local': 99,
-                'RC': 99,
-                'UNKNOWN': 100
-            }
-            current_priority = priority_map.get(final_type, 100)
-            
-            for i in range(1, 6):
-                code_col = f'code|{i}'
-                type_col = f'code|{i}|type'
+            for table in iter_tall_csv(file_path, header_row=2):
+                # Verify we have expected columns
+                if count == 0 and 'code|1' not in table.column_names and 'description' not in table.column_names:
+                    print("WARNING: Header detection might be wrong. Columns found:", table.column_names[:5])
                 
-                if code_col in row and type_col in row:
-                    this_code = row[code_col]
-                    this_type = row[type_col]
-                    
-                    if pd.isna(this_code) or pd.isna(this_type):
-                        continue
-
-                    # VALIDATION: Ignore bogus HCPCS/CPT codes
-                    if this_type in ['CPT', 'HCPCS']:
-                        if len(str(this_code).strip()) != 5:
-                            this_type = 'Local'
-                        
-                    this_prio = priority_map.get(this_type, 100)
-                    
-                    # If this code is higher priority (lower number), swap it in
-                    if this_prio < current_priority:
-                        final_code = this_code
-                        final_type = this_type
-                        current_priority = this_prio
-            
-            # NORMALIZE: Force CPT vs HCPCS based on format
-            # CPT: 5 digits (numeric)
-            # HCPCS: Letter + 4 digits (or similar)
-            if len(str(final_code).strip()) == 5:
-                if str(final_code).isdigit():
-                    final_type = 'CPT'
-                elif str(final_code)[0].isalpha():
-                    final_type = 'HCPCS'
-
-            # -----------------------------------------------------
-
-            desc = row.get('description', 'No Description')
-            
-            # Prefer 'setting' column (e.g. 'outpatient'), fallback to 'billing_class'
-            setting = row.get('setting')
-            if pd.isna(setting) or setting == '':
-                setting = row.get('billing_class', 'UNKNOWN')
-            
-            # 1. Resolve Item (Get ID or Create New)
-            item_key = (final_code, desc, setting)
-            
-            if item_key in item_cache:
-                item_id = item_cache[item_key]
-            else:
-                # Create new item
-                new_item = Item(
-                    code=final_code, 
-                    code_type=final_type,
-                    description=desc, 
-                    hospital_id=hospital_id, 
-                    setting=setting
-                )
-                session.add(new_item)
-                session.flush() # Get the ID
-                item_id = new_item.id
-                item_cache[item_key] = item_id
-
-            # 2. Create Price
-            # Tall CSV has payer/plan in columns
-            
-            # Strategy: Look for specific columns.
-            # Beaumont uses: 'payer_name', 'plan_name', 'standard_charge|negotiated_dollar'
-            # Children's uses: 'standard_charge|Payer|Plan|negotiated_dollar'
-            
-            # Branch A: If 'payer_name' column exists (Beaumont Style)
-            if 'payer_name' in row and not pd.isna(row['payer_name']):
-                payer = row.get('payer_name')
-                plan = row.get('plan_name', None)
-                
-                price_str = row.get('standard_charge|negotiated_dollar')
-                if pd.isna(price_str) or price_str == '':
-                    price_str = row.get('estimated_amount')
-                
-                price_val, price_note = parse_price(price_str)
+                ingest_chunk(session, table, hospital_id, item_cache, price_dedupe_cache)
                 
-                # Sibling extraction for Beaumont (Tall Format)
-                if price_val is None and (price_note is None or "Placeholder" in str(price_note)):
-                    algo_col = 'standard_charge|negotiated_algorithm'
-                    if algo_col in row and not pd.isna(row[algo_col]):
-                        algo_val = str(row[algo_col]).strip()
-                        if algo_val and algo_val != '':
-                            price_note = f"Algorithm: {algo_val}"
-                            
-                if price_val is not None or price_note is not None:
-                    session.add(Price(item_id=item_id, payer=payer, plan=plan, amount=price_val, notes=price_note))
-
-            # Branch B: If columns define payers (Children's Style)
-            # We scan columns for 'negotiated_dollar' or 'estimated_amount'
-            else:
-                # Children's Format: "standard_charge|Payer Name|Plan Name|negotiated_dollar"
-                for col in df.columns:
-                    # Check for dollar columns OR algorithm/methodology columns
-                    is_dollar_col = 'negotiated_dollar' in col or 'estimated_amount' in col
-                    
-                    # Also check for corresponding 'negotiated_algorithm' column if price is empty?
-                    # Actually, 'negotiated_dollar' column itself sometimes contains the "Formula..." string in this dataset.
-                    
-                    if is_dollar_col:
-                        price_val, price_note = parse_price(row[col])
-                        
-                        # If we didn't get a price, maybe check the 'negotiated_algorithm' sibling column?
-                        # Sibling extraction logic:
-                        if price_val is None and (price_note is None or "Placeholder" in str(price_note)):
-                             # Construct potential sibling column names
-                             # e.g. replace 'negotiated_dollar' with 'negotiated_algorithm' or 'methodology'
-                             potential_suffixes = ['negotiated_algorithm', 'methodology', 'negotiated_percentage']
-                             base_col = col
-                             
-                             for suffix in potential_suffixes:
-                                 # Try replacing last part
-                                 parts = base_col.split('|')
-                                 if parts[-1] in ['negotiated_dollar', 'estimated_amount']:
-                                     parts[-1] = suffix
-                                     sibling_col = "|".join(parts)
-                                     
-                                     if sibling_col in row and not pd.isna(row[sibling_col]):
-                                         sibling_val = str(row[sibling_col]).strip()
-                                         if sibling_val and sibling_val != '':
-                                             price_note = f"{suffix}: {sibling_val}"
-                                             break
-                        
-                        if price_val is not None or price_note is not None:
-                            # Parse Payer/Plan from column header
-                            # Example: standard_charge|United Healthcare|UnitedHealthcareNewBusiness|negotiated_dollar
-                            parts = col.split('|')
-                            
-                            if len(parts) >= 3:
-                                # Assuming standard_charge|PAYER|PLAN|...
-                                # Sometimes it might be: estimated_amount|PAYER|PLAN
-                                
-                                # Find index of Payer. Usually index 1.
-                                payer_name = parts[1]
-                                plan_name = parts[2] if len(parts) > 2 else None
-                                
-                                # Clean up if last part is 'negotiated_dollar' etc.
-                                if plan_name in ['negotiated_dollar', 'estimated_amount', 'negotiated_percentage']:
-                                    plan_name = None
-                                    
-                                session.add(Price(item_id=item_id, payer=payer_name, plan=plan_name, amount=price_val, notes=price_note))
-
-            # B. Gross / Cash Prices (Common to both usually)
-            # Capture location/notes from the last column to distinguish duplicates
-            notes_col = row.get('additional_generic_notes')
-            location_info = None
-            if not pd.isna(notes_col):
-                location_info = str(notes_col).replace('Gross Charge Type:', '').strip()
-
-            gross_str = row.get('standard_charge|gross')
-            gross_val, gross_note = parse_price(gross_str)
-            if gross_val is not None or gross_note is not None:
-                 # Append location info to notes if present
-                 final_note = gross_note
-                 if location_info and gross_note: final_note = f"{gross_note} | {location_info}"
-                 elif location_info: final_note = location_info
-                 
-                 # Deduplication Check
-                 dedupe_key = (item_id, 'GROSS', gross_val, final_note)
-                 if dedupe_key not in price_dedupe_cache:
-                     session.add(Price(item_id=item_id, payer="GROSS", plan=None, amount=gross_val, notes=final_note))
-                     price_dedupe_cache.add(dedupe_key)
-
-            cash_str = row.get('standard_charge|discounted_cash')
-            cash_val, cash_note = parse_price(cash_str)
-            if cash_val is not None or cash_note is not None:
-                 final_note = cash_note
-                 if location_info and cash_note: final_note = f"{cash_note} | {location_info}"
-                 elif location_info: final_note = location_info
-
-                 # Deduplication Check
-                 dedupe_key = (item_id, 'DISCOUNTED_CASH', cash_val, final_note)
-                 if dedupe_key not in price_dedupe_cache:
-                     session.add(Price(item_id=item_id, payer="DISCOUNTED_CASH", plan=None, amount=cash_val, notes=final_note))
-                     price_dedupe_cache.add(dedupe_key)
-            
-            count += 1
-            if count % 1000 == 0:
+                count += table.num_rows
                 print(f"Processed {count} rows...")
-                session.commit()
 
-        session.commit()
+            if rebuild_indexes:
+                print("Rebuilding price indexes...")
+                for index in Price.__table__.indexes:
+                    index.create(bind=conn, checkfirst=True)
+
+        print(f"Inserted {len(item_cache)} items.")
         print("--- Ingestion Complete ---")
 
     except Exception as e:
+        # session.begin() has already rolled the transaction back
         print(f"Error: {e}")
-        session.rollback()
-    finally:
-        session.close()
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
@@ -1,201 +1,313 @@
+import numpy as np
 import pandas as pd
 import sys
 import os
+import re
+import io
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # Add project root to python path
 sys.path.append(os.getcwd())
 
-from sqlalchemy.orm import Session
-from src.database import SessionLocal, Item, Price, init_db
+from src.database import engine, Item, Price, init_db
+from src.ingest_utils import FORMULA_RE, detect_encoding, read_csv_batches, column_values, code_priorities
 
-# Helper function to parse currency
-def parse_price(price_str):
+# Prices are sent to the DB as multi-row INSERTs of this many rows
+PRICE_BATCH_SIZE = 10000
+
+# Worker processes parsing CSV blocks while the main process writes to the DB.
+# Each one holds a block or two in memory, so this is capped rather than one per core.
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Core INSERTs built once and reused for every batch. RETURNING hands back the
+# new item IDs in the order the rows were sent.
+ITEM_INSERT = Item.__table__.insert().returning(Item.__table__.c.id, sort_by_parameter_order=True)
+PRICE_INSERT = Price.__table__.insert()
+PRICE_COLUMNS = ['item_id', 'payer', 'plan', 'amount', 'notes']
+
+# On Postgres, prices are bulk-loaded with COPY. Missing values are written as \N
+# so that an empty note stays an empty string rather than turning into NULL.
+COPY_NULL = '\\N'
+PRICE_COPY_SQL = (
+    f"COPY {Price.__tablename__} ({', '.join(PRICE_COLUMNS)}) "
+    f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+)
+
+# CPT: 5 digits (numeric)
+# HCPCS: a letter, then 5 characters in all once surrounding whitespace is stripped (e.g. 'A1234')
+CPT_RE = re.compile(r'\d{5}')
+HCPCS_RE = re.compile(r'[^\W\d_].{3}\S\s*', re.DOTALL)
+
+def parse_price_series(series):
     """
-    Returns tuple: (price_value, notes_str)
+    Parses a whole column of price cells (a pandas Series of strings) at once.
+    Returns (values, notes) object arrays, None where absent:
+    numbers (with $ and , stripped) become values, formula or other text becomes a note,
+    and blanks and placeholder prices (>= 99999999) become neither.
+    Unlike ingest_tall's parse_price_array, a whitespace-only cell counts as present
+    (it is checked before trimming) and becomes an empty '' note.
     """
-    if pd.isna(price_str) or price_str == '':
-        return None, None
-        
-    price_str_clean = str(price_str).strip()
+    present = (series.notna() & series.ne('')).to_numpy()
+    text = series.str.strip()
+
+    # Heuristic for Formulas (one regex scan per column)
+    is_formula = text.str.contains(FORMULA_RE, na=False).to_numpy(dtype=bool)
+
+    # Remove $ and , and convert to float; anything that doesn't parse becomes NaN
+    cleaned = text.where(~is_formula).str.replace('$', '', regex=False).str.replace(',', '', regex=False)
+    vals = pd.to_numeric(cleaned, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    parsed = ~np.isnan(vals)
+
+    # For ingest_wide (UofM), check for placeholders if they exist (though UofM data looked cleaner)
+    # But for consistency, let's apply the same 99999999 check
+    keep_value = present & ~is_formula & parsed & (vals < 99999999)
+    # Return original string as note if parse fails
+    keep_note = present & (is_formula | ~parsed)
+
+    values = np.where(keep_value, vals, None)
+    notes = np.where(keep_note, text.to_numpy(dtype=object), None)
+    return values, notes
+
+def select_codes(df):
+    """
+    Smart Code Extraction, vectorized over all rows.
+    We prioritize: CPT > HCPCS > MS-DRG > APR-DRG > NDC > CDM
+    Candidates are code|1 as listed followed by each code|i that has both a code and
+    a type; the first one with the lowest priority wins (same as a strict '<' scan).
+    Returns (codes, types) object arrays.
+    """
+    n = len(df)
+    pairs = [
+        (f'code|{i}', f'code|{i}|type')
+        for i in range(1, 6)
+        if f'code|{i}' in df.columns and f'code|{i}|type' in df.columns
+    ]
+
+    codes = np.empty((n, len(pairs) + 1), dtype=object)
+    types = np.empty((n, len(pairs) + 1), dtype=object)
+    priorities = np.empty((n, len(pairs) + 1), dtype=np.int8)
+
+    # Column 0: code|1 exactly as listed (the starting point of the scan)
+    codes[:, 0] = column_values(df, 'code|1', 'UNKNOWN')
+    types[:, 0] = column_values(df, 'code|1|type', 'UNKNOWN')
+    priorities[:, 0] = code_priorities(types[:, 0])
+
+    if pairs:
+        codes[:, 1:] = df[[code_col for code_col, _ in pairs]].to_numpy(dtype=object)
+        types[:, 1:] = df[[type_col for _, type_col in pairs]].to_numpy(dtype=object)
+
+        candidate_prio = code_priorities(types[:, 1:].ravel()).reshape(n, len(pairs))
+        # Rows missing a code or type can never win. The null masks come straight from
+        # the Arrow-backed string columns (a validity-bitmap read), not from
+        # checking each cell of the object copies above.
+        missing = (df[[code_col for code_col, _ in pairs]].isna().to_numpy()
+                   | df[[type_col for _, type_col in pairs]].isna().to_numpy())
+        candidate_prio[missing] = 127
+        priorities[:, 1:] = candidate_prio
+
+    winners = priorities.argmin(axis=1)[:, None]
+    return (np.take_along_axis(codes, winners, axis=1).ravel(),
+            np.take_along_axis(types, winners, axis=1).ravel())
+
+def price_column_spec(col):
+    """
+    Returns (payer, plan) for a standard_charge column header.
+    UofM Format: "standard_charge|Payer Name|Plan Name|negotiated_dollar"
+    """
+    parts = col.split('|')
     
-    # Heuristic for Formulas
-    if 'Formula' in price_str_clean or 'algorithm' in price_str_clean.lower():
-        return None, price_str_clean
+    payer_name = "Unknown"
+    plan_name = None
+
+    if len(parts) > 1:
+        if parts[1] in ['gross', 'discounted_cash', 'min', 'max']:
+            payer_name = parts[1].upper() # GROSS, CASH, MIN, MAX
+            plan_name = "Standard"
+        else:
+            payer_name = parts[1] # The Insurance Company Name
+            if len(parts) > 2:
+                plan_name = parts[2] # The Plan Name (HMO, PPO, etc.)
+    return payer_name, plan_name
+
+def plan_price_columns(columns):
+    """
+    Works out, once per file, how each price column is read.
+    Returns a list of (col, payer, plan, siblings) where siblings lists the
+    (suffix, sibling_col) pairs to take a note from when the cell is empty.
+    """
+    # We look for columns that indicate a price.
+    # Strategy: If it contains "standard_charge", we parse it.
+    # TODO: Make this filter customizable for other hospitals
+    # UofM has 'negotiated_algorithm', 'negotiated_percentage', 'methodology'
+    potential_suffixes = ['negotiated_algorithm', 'methodology', 'negotiated_percentage']
+    price_specs = []
+    for col in columns:
+        if 'standard_charge' not in col:
+            continue
+        payer_name, plan_name = price_column_spec(col)
+
+        siblings = []
+        parts = col.split('|')
+        # UofM keys usually end in 'negotiated_dollar' or similar
+        if parts[-1] in ['negotiated_dollar', 'estimated_amount']:
+            for suffix in potential_suffixes:
+                sibling_col = "|".join(parts[:-1] + [suffix])
+                if sibling_col in columns:
+                    siblings.append((suffix, sibling_col))
+
+        price_specs.append((col, payer_name, plan_name, siblings))
+    return price_specs
+
+def parse_chunk(batch, hospital_id, price_specs):
+    """
+    Turns one record batch into (item_rows, prices): one item dict per row, and a
+    prices DataFrame whose __row__ column points at the row's item.
+    Runs in a worker process; price_specs comes from plan_price_columns and is shared by every chunk.
+    """
+    # Arrow strings come through as pandas' pyarrow-backed string dtype (pandas >= 3),
+    # so isna() on these columns reads the validity bitmap
+    df = batch.to_pandas()
+
+    # 1. Build one item per row
+    final_codes, final_types = select_codes(df)
+
+    # NORMALIZE: Force CPT vs HCPCS based on format, one regex pass over all codes
+    code_series = pd.Series(final_codes, dtype=object)
+    is_cpt = code_series.str.fullmatch(CPT_RE).eq(True).to_numpy()
+    is_hcpcs = code_series.str.fullmatch(HCPCS_RE).eq(True).to_numpy()
+    final_types = np.where(is_cpt, 'CPT', np.where(is_hcpcs, 'HCPCS', final_types))
 
+    # -------------------------------------------------------
+
+    item_rows = [
+        {'code': code, 'code_type': code_type, 'description': desc, 'hospital_id': hospital_id, 'setting': setting}
+        for code, code_type, desc, setting in zip(
+            final_codes.tolist(),
+            final_types.tolist(),
+            column_values(df, 'description', 'No Description'),
+            column_values(df, 'billing_class', 'UNKNOWN'),
+        )
+    ]
+
+    # 2. Extract Prices (The "Melting" Phase)
+    price_cols = [col for col, _, _, _ in price_specs]
+    row_count = len(df)
+
+    # One long table of (row, col, raw) with every price cell of every row,
+    # laid out column by column
+    melted = df[price_cols].assign(__row__=np.arange(row_count)).melt(
+        id_vars='__row__', var_name='col', value_name='raw'
+    )
+    amounts, notes = parse_price_series(melted['raw'])
+    # One mask of cells with neither a price nor a note, kept up to date below
+    # instead of re-checking the object arrays for None
+    empty = np.equal(amounts, None) & np.equal(notes, None)
+
+    # Sibling check for UofM
+    # Cells with neither a price nor a note take their note from the first sibling column with text
+    for j, (_, _, _, siblings) in enumerate(price_specs):
+        if not siblings:
+            continue
+        block = slice(j * row_count, (j + 1) * row_count)
+        missing = empty[block]  # A view, so filling a note clears it in `empty` too
+        for suffix, sibling_col in siblings:
+            sibling_val = df[sibling_col].str.strip()
+            use = missing & (sibling_val.notna() & sibling_val.ne('')).to_numpy()
+            notes[block] = np.where(use, (f"{suffix}: " + sibling_val).to_numpy(dtype=object), notes[block])
+            missing &= ~use
+
+    # Payer and Plan repeat per column block, same layout as the melted cells
+    payers = np.repeat(np.array([payer for _, payer, _, _ in price_specs], dtype=object), row_count)
+    plans = np.repeat(np.array([plan for _, _, plan, _ in price_specs], dtype=object), row_count)
+
+    keep = ~empty
+    prices = pd.DataFrame({
+        '__row__': melted['__row__'].to_numpy()[keep],
+        'payer': payers[keep],
+        'plan': plans[keep],
+        'amount': amounts[keep],
+        'notes': notes[keep],
+    })
+    prices = prices.astype(object).where(prices.notna(), None)
+
+    return item_rows, prices
+
+def write_chunk(conn, item_rows, prices):
+    """Inserts one parsed chunk: all items in one multi-row INSERT ... RETURNING, then the prices."""
+    item_ids = np.array(conn.execute(ITEM_INSERT, item_rows).scalars().all())
+
+    prices['item_id'] = item_ids[prices['__row__'].to_numpy(dtype=np.int64)].tolist()
+    if conn.dialect.name == 'postgresql':
+        copy_prices(conn, prices[PRICE_COLUMNS])
+        return len(item_rows)
+
+    records = prices[PRICE_COLUMNS].to_dict('records')
+    for start in range(0, len(records), PRICE_BATCH_SIZE):
+        conn.execute(PRICE_INSERT, records[start:start + PRICE_BATCH_SIZE])
+    return len(item_rows)
+
+def copy_prices(conn, prices):
+    """
+    Postgres only: streams the prices in with COPY ... FROM STDIN instead of INSERTs,
+    on the same connection (and transaction) as the rest of the load.
+    """
+    buffer = io.StringIO()
+    prices.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+
+    cursor = conn.connection.dbapi_connection.cursor()
     try:
-        # Remove $ and , and convert to float
-        clean = price_str_clean.replace('$', '').replace(',', '')
-        val = float(clean)
-        
-        # For ingest_wide (UofM), check for placeholders if they exist (though UofM data looked cleaner)
-        # But for consistency, let's apply the same 99999999 check
-        if val >= 99999999:
-            return None, None
-            
-        return val, None
-    except:
-        # Return original string as note if parse fails
-        return None, price_str_clean
+        if hasattr(cursor, 'copy_expert'):
+            cursor.copy_expert(PRICE_COPY_SQL, buffer)  # psycopg2
+        else:
+            with cursor.copy(PRICE_COPY_SQL) as copy:  # psycopg 3
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
 
 def ingest_wide_csv(file_path, hospital_id="UNKNOWN"):
     print(f"--- Starting Wide CSV Ingestion for: {file_path} (Hospital: {hospital_id}) ---")
     
     # Initialize DB tables
     init_db()
-    
-    # Create a DB session
-    session = SessionLocal()
 
     try:
         # Read the CSV
         # NOTE: This header=2 is specific to UofM's file structure (skipping first 2 lines).
         # In a fully generic script, we might detect this or pass it as an arg.
         print("Reading CSV... (this may take a moment)")
-        try:
-            df = pd.read_csv(file_path, header=2, dtype=str, encoding='utf-8')
-        except UnicodeDecodeError:
-            print("UTF-8 failed. Trying ISO-8859-1...")
-            df = pd.read_csv(file_path, header=2, dtype=str, encoding='iso-8859-1')
+        encoding = detect_encoding(file_path)
         
-        print(f"Loaded {len(df)} rows. Processing...")
-
-        # Iterate through rows
+        price_specs = None
         count = 0
-        for index, row in df.iterrows():
-            # 1. Smart Code Extraction
-            # We want to prioritize standard codes (CPT, HCPCS, DRG) over internal CDM codes
-            
-            final_code = row.get('code|1', 'UNKNOWN')
-            final_type = row.get('code|1|type', 'UNKNOWN')
-            
-            # Scan columns 1 through 5 (assumed max) for a better code
-            # We prioritize: CPT > HCPCS > MS-DRG > APR-DRG > NDC > CDM
-            
-            priority_map = {
-                'CPT': 1,
-                'HCPCS': 2,
-                'MS-DRG': 3,
-                'APR-DRG': 4,
-                'NDC': 5,
-                'CDM': 99,
-                'Local': 99,
-                'RC': 99,
-                'UNKNOWN': 100
-            }
-            
-            current_priority = priority_map.get(final_type, 100)
-            
-            for i in range(1, 6):
-                code_col = f'code|{i}'
-                type_col = f'code|{i}|type'
+        pending = deque()
+        
+        # Stream the file in blocks (Arrow's multithreaded reader), so memory stays
+        # flat however wide or long the file is. Blocks are parsed in worker processes
+        # while this process writes the finished ones, in file order. All chunks are
+        # written in ONE transaction: a single commit at the end, and a failed load
+        # leaves nothing behind.
+        with engine.begin() as conn, ProcessPoolExecutor(max_workers=PARSE_WORKERS) as executor:
+            for batch in read_csv_batches(file_path, header_row=2, encoding=encoding):
+                if price_specs is None:
+                    price_specs = plan_price_columns(batch.schema.names)
                 
-                if code_col in row and type_col in row:
-                    this_code = row[code_col]
-                    this_type = row[type_col]
-                    
-                    if pd.isna(this_code) or pd.isna(this_type):
-                        continue
-                        
-                    this_prio = priority_map.get(this_type, 100)
-                    
-                    # If this code is higher priority (lower number), swap it in
-                    if this_prio < current_priority:
-                        final_code = this_code
-                        final_type = this_type
-                        current_priority = this_prio
-            
-            # NORMALIZE: Force CPT vs HCPCS based on format
-            # CPT: 5 digits (numeric)
-            # HCPCS: Letter + 4 digits (or similar)
-            if len(str(final_code).strip()) == 5:
-                if str(final_code).isdigit():
-                    final_type = 'CPT'
-                elif str(final_code)[0].isalpha():
-                    final_type = 'HCPCS'
-
-            # -------------------------------------------------------
-            
-            desc = row.get('description', 'No Description')
-            setting = row.get('billing_class', 'UNKNOWN')
+                pending.append(executor.submit(parse_chunk, batch, hospital_id, price_specs))
+                # Only a few blocks in flight at once, so memory stays bounded
+                if len(pending) > PARSE_WORKERS:
+                    count += write_chunk(conn, *pending.popleft().result())
+                    print(f"Processed {count} rows...")
             
-            item = Item(
-                code=final_code, 
-                code_type=final_type,
-                description=desc, 
-                hospital_id=hospital_id, 
-                setting=setting
-            )
-            session.add(item)
-            session.flush() # Get the ID of the new item
-
-            # 2. Extract Prices (The "Melting" Phase)
-            # We look for columns that indicate a price.
-            # Strategy: If it contains "standard_charge", we parse it.
-            
-            for col in df.columns:
-                # TODO: Make this filter customizable for other hospitals
-                if 'standard_charge' in col:
-                    price_val, price_note = parse_price(row[col])
-                    
-                    if price_val is None and price_note is None:
-                         # Sibling check for UofM
-                         # UofM has 'negotiated_algorithm', 'negotiated_percentage', 'methodology'
-                         potential_suffixes = ['negotiated_algorithm', 'methodology', 'negotiated_percentage']
-                         base_col = col
-                         
-                         for suffix in potential_suffixes:
-                             # Try replacing last part
-                             parts = base_col.split('|')
-                             # UofM keys usually end in 'negotiated_dollar' or similar
-                             if parts[-1] in ['negotiated_dollar', 'estimated_amount']:
-                                 parts[-1] = suffix
-                                 sibling_col = "|".join(parts)
-                                 if sibling_col in row and not pd.isna(row[sibling_col]):
-                                     sibling_val = str(row[sibling_col]).strip()
-                                     if sibling_val and sibling_val != '':
-                                         price_note = f"{suffix}: {sibling_val}"
-                                         break
-                    
-                    if price_val is not None or price_note is not None:
-                        # Parse the column name to get Payer and Plan
-                        # UofM Format: "standard_charge|Payer Name|Plan Name|negotiated_dollar"
-                        parts = col.split('|')
-                        
-                        payer_name = "Unknown"
-                        plan_name = None
-
-                        if len(parts) > 1:
-                            if parts[1] in ['gross', 'discounted_cash', 'min', 'max']:
-                                payer_name = parts[1].upper() # GROSS, CASH, MIN, MAX
-                                plan_name = "Standard"
-                            else:
-                                payer_name = parts[1] # The Insurance Company Name
-                                if len(parts) > 2:
-                                    plan_name = parts[2] # The Plan Name (HMO, PPO, etc.)
-
-                        # Create Price entry
-                        price_entry = Price(
-                            item_id=item.id,
-                            payer=payer_name,
-                            plan=plan_name,
-                            amount=price_val,
-                            notes=price_note
-                        )
-                        session.add(price_entry)
-
-            count += 1
-            if count % 1000 == 0:
+            while pending:
+                count += write_chunk(conn, *pending.popleft().result())
                 print(f"Processed {count} rows...")
-                session.commit() # Commit every 1000 rows
-                
-        session.commit()
+
         print("--- Ingestion Complete ---")
 
     except Exception as e:
+        # engine.begin() has already rolled the transaction back
         print(f"Error: {e}")
-        session.rollback()
-    finally:
-        session.close()
 
 if __name__ == "__main__":
     # Default usage
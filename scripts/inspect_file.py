@@ -4,6 +4,61 @@ import sys
 import zipfile
 import io
 
+# Bytes read from the stream at a time when previewing a text file
+PREVIEW_READ_SIZE = 256 * 1024
+
+# Bytes fetched per Range request when reading a ZIP in place
+RANGE_READ_AHEAD = 1024 * 1024
+
+class HttpRangeFile(io.RawIOBase):
+    """
+    Read-only, seekable view of a remote file backed by HTTP Range requests.
+    zipfile only needs the end of the archive (the Central Directory) and the
+    first member, so it can list and sample a multi-GB ZIP without downloading it.
+    """
+    def __init__(self, url, size, headers):
+        self.url = url
+        self.size = size
+        self.pos = 0
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        elif whence == io.SEEK_END:
+            self.pos = self.size + offset
+        return self.pos
+
+    def readinto(self, buffer):
+        if self.pos >= self.size:
+            return 0
+        end = min(self.pos + len(buffer), self.size) - 1
+        with self.session.get(self.url, headers={'Range': f'bytes={self.pos}-{end}'}, stream=True) as r:
+            r.raise_for_status()
+            if r.status_code != 206:
+                # 200 means the server ignored the Range header and is sending the whole file
+                raise IOError(f"Server does not support Range requests (HTTP {r.status_code})")
+            data = r.content
+        buffer[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+    def close(self):
+        self.session.close()
+        super().close()
+
 def inspect_url(url, output_path="data/samples/preview.txt"):
     print(f"--- Inspecting: {url} ---")
     
@@ -31,7 +86,7 @@ def inspect_url(url, output_path="data/samples/preview.txt"):
             # Check if 'zip' is in the content-type or if '.zip' appears in the URL path (ignoring query params)
             if 'zip' in content_type or '.zip' in url.split('?')[0].lower():
                 print("\n--- Detected ZIP file ---")
-                handle_zip_stream(r, output_path)
+                handle_zip_stream(r, output_path, headers)
             else:
                 print("\n--- Detected Text/JSON file ---")
                 handle_text_stream(r, output_path)
@@ -41,21 +96,48 @@ def inspect_url(url, output_path="data/samples/preview.txt"):
 
 def handle_text_stream(response, output_path):
     print(f"Downloading first 100 lines to {output_path} ...")
-    with open(output_path, 'wb') as f:
-        lines_captured = 0
-        for line in response.iter_lines():
-            if line: 
-                f.write(line + b'\n')
-                lines_captured += 1
-            
-            if lines_captured >= 100:
+    # Read the raw stream in big blocks (usually one is enough) and split once,
+    # instead of pulling it through iter_lines one line at a time
+    buffer = b''
+    newlines = 0
+    while True:
+        chunk = response.raw.read(PREVIEW_READ_SIZE, decode_content=True)
+        buffer += chunk
+        newlines += chunk.count(b'\n')
+        # More than 100 line breaks means the 100th line is complete (unless some are blank)
+        if not chunk or newlines > 100:
+            lines = [line for line in buffer.splitlines() if line]
+            if not chunk or len(lines) > 100:
                 break
+
+    with open(output_path, 'wb') as f:
+        f.write(b''.join(line + b'\n' for line in lines[:100]))
     print("Done. Check the preview file.")
 
-def handle_zip_stream(response, output_path):
+def extract_zip_sample(z, output_path):
+    print(f"Files inside: {z.namelist()}")
+    first_file = z.namelist()[0]
+    print(f"Reading first 100 lines of: {first_file}")
+    with z.open(first_file) as zf, open(output_path, 'wb') as out:
+        for i in range(100):
+            out.write(zf.readline())
+    print("Success! Extracted sample from zip.")
+
+def handle_zip_stream(response, output_path, headers):
     # ZIPs are tricky to stream because the Central Directory is at the END of the file.
-    # However, we can try to download a chunk and see if we get the first local file header.
-    # If the file is small (< 50MB), just download the whole thing.
+    # So we use HTTP Range headers to read just the end of the file (and the first member)
+    # in place, and only download the whole thing if the server can't do ranges.
+    size_bytes = response.headers.get('content-length')
+    if size_bytes:
+        print("Reading ZIP in place with HTTP Range requests...")
+        try:
+            remote = io.BufferedReader(HttpRangeFile(response.url, int(size_bytes), headers),
+                                       buffer_size=RANGE_READ_AHEAD)
+            with remote, zipfile.ZipFile(remote) as z:
+                extract_zip_sample(z, output_path)
+            return
+        except (IOError, zipfile.BadZipFile) as e:
+            print(f"Could not read the ZIP with Range requests ({e}). Falling back to a full download.")
     
     temp_zip = "data/samples/temp_partial.zip"
     print(f"Downloading ZIP to {temp_zip}...")
@@ -66,30 +148,14 @@ def handle_zip_stream(response, output_path):
     
     print("Attempting to read zip...")
     try:
-        # We rely on the zipfile library's ability to handle some truncated files 
-        # or we just list what we can. *Warning*: Valid ZIPs require the footer. 
-        # This is a 'best effort' hack. If it fails, we might need to download more.
-        # A robust production way is to use HTTP Range headers to get the END of the file first.
-        
-        # actually, python's zipfile is strict. Let's try a different approach:
-        # If we can't open it, we just say "It's a zip, download full file to inspect".
-        # But let's try:
         if zipfile.is_zipfile(temp_zip):
             with zipfile.ZipFile(temp_zip, 'r') as z:
-                print(f"Files inside: {z.namelist()}")
-                first_file = z.namelist()[0]
-                print(f"Reading first 100 lines of: {first_file}")
-                with z.open(first_file) as zf, open(output_path, 'wb') as out:
-                    for i in range(100):
-                        out.write(zf.readline())
-            print("Success! Extracted sample from zip.")
+                extract_zip_sample(z, output_path)
         else:
-            print("Could not open partial zip (headers missing or file too truncated).")
-            print("Recommendation: For ZIPs, we might need to download the whole thing or use Range headers.")
+            print("Could not open zip (headers missing or file truncated).")
             
     except Exception as e:
-        print(f"Zip Error (expected for partial download): {e}")
-        print("NOTE: To properly inspect a ZIP without full download, we need HTTP Range support.")
+        print(f"Zip Error: {e}")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
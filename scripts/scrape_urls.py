@@ -1,6 +1,12 @@
 import asyncio
 from playwright.async_api import async_playwright
 import json
+import re
+
+# The hospital list comes back from this API call (compiled once, checked on every response)
+API_URL_RE = re.compile(r'searchstate=MI')
+# Only script-initiated requests can be the API; images, CSS, documents etc. are skipped
+API_RESOURCE_TYPES = ('xhr', 'fetch')
 
 async def scrape_michigan_urls():
     print("--- API Spy Mode ---")
@@ -14,7 +20,12 @@ async def scrape_michigan_urls():
         
         # Network Listener
         async def handle_response(response):
-            if "searchstate=MI" in response.url:
+            # Cheap checks first: most responses are page assets, and only JSON is worth awaiting
+            if response.request.resource_type not in API_RESOURCE_TYPES:
+                return
+            if 'json' not in response.headers.get('content-type', ''):
+                return
+            if API_URL_RE.search(response.url):
                 print(f"\n>>> CAUGHT API RESPONSE: {response.url}")
                 try:
                     data = await response.json()
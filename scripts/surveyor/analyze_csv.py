@@ -14,16 +14,43 @@ Features:
 - Deep JSON structure analysis
 """
 
+import io
 import json
 import os
 import sys
 import re
 import csv
+import codecs
 import zipfile
+import shutil
+import contextlib
+import hashlib
+import math
+import mmap
+import signal
 from pathlib import Path
 from datetime import datetime
 from collections import Counter
-import statistics
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import random
+
+import numpy as np
+from numba import njit
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+import ijson
+
+try:
+    from charset_normalizer import from_bytes
+except ImportError:
+    from_bytes = None  # Optional: non-UTF-8 files then default to ISO-8859-1
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Optional: the stdlib json module then parses small files and writes profiles
 
 # Configuration
 DATA_DIR = Path(__file__).parent.parent.parent / "data"
@@ -33,9 +60,65 @@ MANIFEST_FILE = DOWNLOADS_DIR / "download_manifest.json"
 ANALYSIS_MANIFEST = PROFILES_DIR / "analysis_manifest.json"
 
 # Sample size for very large files (rows to analyze)
-MAX_ROWS_TO_ANALYZE = 50000  # Analyze up to 50K rows
+MAX_ROWS_TO_ANALYZE = 50000  # Analyze a uniform random sample of up to 50K rows
+SAMPLE_SEED = 42  # Fixed seed so re-running the analysis picks the same rows
 SAMPLE_SIZE = 10  # Number of sample values to store
+SAMPLE_SCAN_CHUNK = 1024  # Cells converted to Python at a time while collecting sample values
 MAX_JSON_RECORDS = 10000  # Analyze up to 10K records for JSON
+JSON_SAMPLE_MIN = 1000  # Records analyzed at least (when there are that many); the sample grows from here
+JSON_SHAPE_PROBE = 500  # Records checked for distinct key sets when sizing the sample
+JSON_SAMPLE_OVERRIDE = int(os.environ.get("SURVEYOR_SAMPLE_SIZE", 0))  # Fixed JSON sample size (0 = computed)
+ANALYSIS_WORKERS = min(8, os.cpu_count() or 1)  # Files are independent; more workers just contend for disk
+MANIFEST_SAVE_EVERY = 50  # Analyses between manifest saves (plus a final save on exit/interrupt)
+
+# JSON layout: top-level keys kept as metadata, and where the charge array may live (in priority order)
+JSON_METADATA_KEYS = ['hospital_name', 'last_updated_on', 'version', 'hospital_location', 'hospital_address']
+JSON_RECORD_KEYS = ['standard_charge_information', 'charges', 'items', 'data']
+# ijson events that begin a value (map_key and end_* never do)
+JSON_VALUE_EVENTS = {'start_map', 'start_array', 'null', 'boolean', 'integer', 'double', 'number', 'string'}
+JSON_LOAD_MAX_BYTES = 64 * 1024 * 1024  # Smaller JSON files are parsed in one call instead of streamed
+SAMPLE_RECORD_MAX_CHARS = 5000  # Larger first records are stored as their keys only
+# orjson profile output: indented like json.dump(indent=2); numpy values and non-string keys allowed
+PROFILE_JSON_OPTIONS = (orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+CSV_BLOCK_SIZE = 4 * 1024 * 1024  # Bytes per Arrow CSV block when streaming data rows
+HEADER_PROBE_ROWS = 16  # Rows read for header detection
+HEADER_PROBE_SIZE = 128 * 1024  # Bytes searched for those rows' line breaks
+
+# ZIP handling
+DATA_FILE_SUFFIXES = ('.csv', '.json')  # ZIP members we can analyze
+ZIP_COPY_CHUNK = 1024 * 1024  # Stream members to disk 1MB at a time
+
+# Source file identity: size, mtime and a hash of both ends (cheap even for multi-GB files)
+FINGERPRINT_EDGE_SIZE = 4096
+
+# Encoding detection: one small binary read, BOMs checked before any decoding
+ENCODING_PROBE_SIZE = 4096
+BOM_ENCODINGS = ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+LEGACY_ENCODINGS = ['cp1252', 'iso-8859-1']  # Candidates when the file isn't UTF-8
+
+# Value patterns: run over whole columns with Arrow's RE2 kernels, and compiled
+# once for the single-value checks. NUMBER_PATTERN is what float() accepts;
+# CODE_PATTERN is CPT | HCPCS | ICD-10 | DRG | NDC | revenue code in one alternation
+NUMBER_PATTERN = r'(?i)^[+-]?((\d+\.?\d*|\.\d+)(e[+-]?\d+)?|inf|infinity|nan)$'
+CODE_PATTERN = r'^(\d{5}|[A-Za-z]\d{4}|[A-Za-z]\d{2,3}\.?\d*|\d{3}|\d{4,5}-\d{3,4}-\d{1,2}|\d{4})$'
+NUMBER_RE = re.compile(NUMBER_PATTERN)
+CODE_RE = re.compile(CODE_PATTERN)
+NULL_STRING = pa.scalar(None, pa.string())
+
+# Column name keywords -> inferred purpose.
+# IMPORTANT: Order matters! More specific patterns must come first: payer/plan are
+# checked before "name", so payer_name/plan_name never reach the description rule
+PURPOSE_RULES = [
+    ("payer", re.compile(r'payer|insurance|carrier')),
+    ("plan", re.compile(r'plan|product')),
+    ("code", re.compile(r'code|cpt|hcpcs|icd|drg|ndc')),
+    ("description", re.compile(r'desc|procedure|service|name')),
+    ("price", re.compile(r'charge|price|amount|rate|dollar|cost')),
+    ("category", re.compile(r'type|class|category|setting')),
+    ("notes", re.compile(r'note|comment|additional|modifier')),
+    ("standard_charge", re.compile(r'gross|cash|discounted')),
+    ("negotiated_rate", re.compile(r'negotiated|contract')),
+]
 
 
 def format_number(value, default="N/A"):
@@ -47,43 +130,58 @@ def format_number(value, default="N/A"):
     return str(value)
 
 
+def find_data_files(directory):
+    """Collect every .csv/.json file under a directory in one scandir walk."""
+    data_files = []
+    pending = [directory]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    pending.append(entry.path)
+                elif entry.name.lower().endswith(DATA_FILE_SUFFIXES):
+                    data_files.append(Path(entry.path))
+    return data_files
+
+
 def extract_zip_file(zip_path):
     """
-    Extract a ZIP file to a subdirectory.
+    Extract a ZIP file's largest .csv/.json member to a subdirectory (the only one
+    analysis or ingest ever reads).
     Returns the path to the extracted directory and list of data files found.
     """
     zip_path = Path(zip_path)
     extract_dir = zip_path.parent / "extracted"
     
-    # Check if already extracted
+    # Check if already extracted (from this download: a re-downloaded ZIP is newer than its old files)
     if extract_dir.exists():
         # Find existing data files
-        data_files = list(extract_dir.glob("**/*.csv")) + list(extract_dir.glob("**/*.json"))
-        if data_files:
+        data_files = find_data_files(extract_dir)
+        if data_files and min(f.stat().st_mtime for f in data_files) >= zip_path.stat().st_mtime:
             return extract_dir, data_files
+        for stale_file in data_files:
+            stale_file.unlink()
     
     # Extract ZIP
     extract_dir.mkdir(parents=True, exist_ok=True)
     
     try:
         with zipfile.ZipFile(zip_path, 'r') as zf:
-            # Extract only data files
-            for name in zf.namelist():
-                # Skip directories and non-data files
-                if name.endswith('/'):
-                    continue
-                if not any(name.lower().endswith(ext) for ext in ['.csv', '.json', '.xlsx', '.xls']):
-                    continue
+            # Pick the largest data file from the central directory (sizes are known without reading)
+            members = [info for info in zf.infolist()
+                       if not info.is_dir() and info.filename.lower().endswith(DATA_FILE_SUFFIXES)]
+            if members:
+                info = max(members, key=lambda member: member.file_size)
                 
                 # Extract to flat structure (avoid nested folders)
-                filename = Path(name).name
-                target_path = extract_dir / filename
+                target_path = extract_dir / Path(info.filename).name
                 
-                with zf.open(name) as source, open(target_path, 'wb') as target:
-                    target.write(source.read())
+                # Stream in chunks so a multi-GB member never sits in memory
+                with zf.open(info) as source, open(target_path, 'wb') as target:
+                    shutil.copyfileobj(source, target, ZIP_COPY_CHUNK)
         
         # Find extracted data files
-        data_files = list(extract_dir.glob("*.csv")) + list(extract_dir.glob("*.json"))
+        data_files = find_data_files(extract_dir)
         return extract_dir, data_files
         
     except Exception as e:
@@ -119,26 +217,101 @@ def load_analysis_manifest():
     }
 
 
+def file_fingerprint(file_path):
+    """
+    Identify a downloaded file's content without reading all of it:
+    size, mtime and a hash of its first and last FINGERPRINT_EDGE_SIZE bytes.
+    Returns None if the file is missing.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            digest = hashlib.blake2b(f.read(FINGERPRINT_EDGE_SIZE), digest_size=16)
+            if st.st_size > FINGERPRINT_EDGE_SIZE:
+                f.seek(max(FINGERPRINT_EDGE_SIZE, st.st_size - FINGERPRINT_EDGE_SIZE))
+                digest.update(f.read())
+    except OSError:
+        return None
+    return f"{st.st_size}:{st.st_mtime_ns}:{digest.hexdigest()}"
+
+
+def is_already_analyzed(analysis_manifest, hospital_id, download_info):
+    """Completed before, and the downloaded file is still the one that was analyzed."""
+    entry = analysis_manifest["analyses"].get(hospital_id, {})
+    if entry.get("status") != "completed" or not entry.get("fingerprint"):
+        return False
+    return entry["fingerprint"] == file_fingerprint(download_info.get("file_path") or "")
+
+
 def save_analysis_manifest(manifest):
-    """Save analysis manifest."""
+    """Save analysis manifest (temp file + rename, so a crash never leaves it half-written)."""
     manifest["last_updated"] = datetime.now().isoformat()
-    with open(ANALYSIS_MANIFEST, 'w') as f:
-        json.dump(manifest, f, indent=2)
+    tmp_path = ANALYSIS_MANIFEST.with_name(ANALYSIS_MANIFEST.name + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, ANALYSIS_MANIFEST)
 
 
 def detect_encoding(file_path):
-    """Detect file encoding by trying common encodings."""
-    encodings = ['utf-8', 'utf-8-sig', 'iso-8859-1', 'cp1252', 'latin1']
+    """
+    Detect file encoding from a single 4KB read: BOM, then strict UTF-8,
+    then charset_normalizer's pick among the legacy Western encodings.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(ENCODING_PROBE_SIZE)
     
-    for encoding in encodings:
-        try:
-            with open(file_path, 'r', encoding=encoding) as f:
-                f.read(10000)  # Try reading first 10KB
+    for bom, encoding in BOM_ENCODINGS:
+        if head.startswith(bom):
             return encoding
-        except (UnicodeDecodeError, UnicodeError):
-            continue
     
-    return 'utf-8'  # Default fallback
+    try:
+        # final=False: a multi-byte character cut off at the end of the probe is fine
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    
+    if from_bytes is not None:
+        best = from_bytes(head, cp_isolation=LEGACY_ENCODINGS).best()
+        if best is not None:
+            return best.encoding
+    
+    return 'iso-8859-1'  # Decodes any byte sequence
+
+
+def read_header_rows(source, encoding):
+    """
+    Read the first HEADER_PROBE_ROWS rows of a mapped CSV for header detection.
+    The line breaks are found with bytes.find, so only those lines are decoded and
+    handed to csv.reader.
+    """
+    # ASCII-compatible encodings (utf-8-sig included): a b'\n' byte is always a line break
+    if codecs.getincrementaldecoder(encoding)().decode(b'\n') == '\n':
+        head = source.read_at(HEADER_PROBE_SIZE, 0)
+        end = -1
+        for _ in range(HEADER_PROBE_ROWS + 1):
+            end = head.find(b'\n', end + 1)
+            if end < 0:
+                break
+        if end >= 0 or len(head) < HEADER_PROBE_SIZE:
+            block = head if end < 0 else head[:end + 1]
+            text = io.StringIO(block.decode(encoding, errors='replace'), newline=None)
+            rows = list(csv.reader(text))
+            # One extra line was taken, so the first rows are whole unless quoted
+            # fields spanned lines; a prefix holding the whole file is always whole
+            if len(rows) > HEADER_PROBE_ROWS or end < 0:
+                return rows[:HEADER_PROBE_ROWS]
+    
+    # UTF-16, '\r'-only line endings, very long or multi-line rows: decode as a stream
+    f = io.TextIOWrapper(source, encoding=encoding, errors='replace')
+    first_rows = []
+    for i, row in enumerate(csv.reader(f)):
+        first_rows.append(row)
+        if i >= HEADER_PROBE_ROWS - 1:
+            break
+    f.detach()  # Keep the mapping open for the data readers
+    source.seek(0)
+    return first_rows
 
 
 def detect_header_row(rows, max_check=10):
@@ -197,12 +370,8 @@ def is_likely_numeric(value):
     if not value or not str(value).strip():
         return False
     
-    clean = str(value).strip().replace('$', '').replace(',', '').replace('%', '')
-    try:
-        float(clean)
-        return True
-    except ValueError:
-        return False
+    clean = str(value).replace('$', '').replace(',', '').replace('%', '').strip()
+    return NUMBER_RE.fullmatch(clean) is not None
 
 
 def is_likely_price(value):
@@ -217,14 +386,10 @@ def is_likely_price(value):
         return True
     
     # Check for decimal numbers in typical price ranges
-    if is_likely_numeric(val_str):
-        try:
-            num = float(val_str.replace('$', '').replace(',', ''))
-            # Prices typically between 0.01 and 10,000,000
-            if 0.01 <= num <= 10000000:
-                return True
-        except:
-            pass
+    clean = val_str.replace(',', '').strip()
+    if NUMBER_RE.fullmatch(clean):
+        # Prices typically between 0.01 and 10,000,000
+        return 0.01 <= float(clean) <= 10000000
     
     return False
 
@@ -234,126 +399,178 @@ def is_likely_code(value):
     if not value:
         return False
     
-    val_str = str(value).strip()
-    
-    # CPT: 5 digits
-    if re.match(r'^\d{5}$', val_str):
-        return True
-    
-    # HCPCS: Letter + 4 digits
-    if re.match(r'^[A-Za-z]\d{4}$', val_str):
-        return True
-    
-    # ICD-10: Letter + digits + optional decimal
-    if re.match(r'^[A-Za-z]\d{2,3}\.?\d*$', val_str):
-        return True
-    
-    # DRG: 3 digits
-    if re.match(r'^\d{3}$', val_str):
-        return True
-    
-    # NDC: 10-11 digits with dashes
-    if re.match(r'^\d{4,5}-\d{3,4}-\d{1,2}$', val_str):
-        return True
-    
-    # Revenue code: 4 digits
-    if re.match(r'^\d{4}$', val_str):
-        return True
-    
-    return False
+    # CPT (5 digits), HCPCS (letter + 4 digits), ICD-10 (letter + digits + optional
+    # decimal), DRG (3 digits), NDC (digits with dashes), revenue code (4 digits)
+    return CODE_RE.fullmatch(str(value).strip()) is not None
+
+
+def read_data_columns(source, encoding, header_row_idx, num_columns):
+    """
+    Stream the data rows below the header (from the start of source) into Arrow string columns,
+    keeping a uniform random sample of MAX_ROWS_TO_ANALYZE rows (in file order) from the whole file.
+    Returns (columns, total_rows). Raises pa.ArrowInvalid on ragged rows or bytes that don't decode.
+    """
+    # Positional names sidestep blank/duplicate headers; everything stays a string
+    names = [f"f{i}" for i in range(num_columns)]
+    read_options = pv.ReadOptions(
+        column_names=names,
+        skip_rows_after_names=header_row_idx + 1,  # Counts parsed rows, like csv.reader
+        encoding=encoding,
+        block_size=CSV_BLOCK_SIZE
+    )
+    parse_options = pv.ParseOptions(newlines_in_values=True)
+    convert_options = pv.ConvertOptions(column_types={n: pa.string() for n in names})
+    
+    # Bottom-k sampling: every row gets a random key, and the rows holding the
+    # MAX_ROWS_TO_ANALYZE smallest keys are a uniform sample (vectorized reservoir)
+    rng = np.random.default_rng(SAMPLE_SEED)
+    sample_keys = np.empty(0)
+    total_rows = 0
+    with pv.open_csv(source, read_options=read_options, parse_options=parse_options,
+                     convert_options=convert_options) as reader:
+        sample = reader.schema.empty_table()
+        for batch in reader:
+            total_rows += batch.num_rows
+            keys = rng.random(batch.num_rows)
+            
+            # Once the sample is full, only rows beating its largest key can get in
+            if len(sample_keys) == MAX_ROWS_TO_ANALYZE:
+                candidates = keys < sample_keys.max()
+                if not candidates.any():
+                    continue
+                batch = batch.filter(pa.array(candidates))
+                keys = keys[candidates]
+            
+            sample = pa.concat_tables([sample, pa.Table.from_batches([batch])])
+            sample_keys = np.concatenate([sample_keys, keys])
+            if len(sample_keys) > MAX_ROWS_TO_ANALYZE:
+                keep = np.sort(np.argpartition(sample_keys, MAX_ROWS_TO_ANALYZE - 1)[:MAX_ROWS_TO_ANALYZE])
+                sample = sample.take(keep)
+                sample_keys = sample_keys[keep]
+    
+    return sample.columns, total_rows
+
+
+def classify_values(values):
+    """
+    Decide the likely type of an Arrow string column of non-empty values, testing
+    price, then code, then numeric, and skipping the remaining kernels once one holds.
+    Returns (likely_type, amounts), where amounts holds each value parsed as a
+    float ('$' and ',' removed), null if it doesn't parse.
+    """
+    total = len(values)
+    trimmed = pc.utf8_trim_whitespace(values)
+    no_currency = pc.replace_substring(pc.replace_substring(trimmed, '$', ''), ',', '')
+    
+    # Price: has a '$', or parses ('%' not allowed) to 0.01 - 10,000,000
+    price_text = pc.utf8_trim_whitespace(no_currency)
+    parsed = pc.match_substring_regex(price_text, NUMBER_PATTERN)
+    amounts = pc.cast(pc.if_else(parsed, price_text, NULL_STRING), pa.float64())
+    in_range = pc.and_(pc.greater_equal(amounts, 0.01), pc.less_equal(amounts, 10000000))
+    is_price = pc.or_(pc.match_substring(trimmed, '$'), pc.fill_null(in_range, False))
+    if (pc.sum(is_price).as_py() or 0) / total > 0.5:
+        return "price", amounts
+    
+    is_code = pc.match_substring_regex(trimmed, CODE_PATTERN)
+    if (pc.sum(is_code).as_py() or 0) / total > 0.5:
+        return "code", amounts
+    
+    # Numeric: '$', ',' and '%' removed, then parseable as a float
+    numeric_text = pc.utf8_trim_whitespace(pc.replace_substring(no_currency, '%', ''))
+    is_numeric = pc.match_substring_regex(numeric_text, NUMBER_PATTERN)
+    if (pc.sum(is_numeric).as_py() or 0) / total > 0.8:
+        return "numeric", amounts
+    
+    return "text", amounts
+
+
+@njit(cache=True)
+def numeric_summary(values):
+    """
+    One pass over a non-empty float64 array.
+    Returns (min, max, mean, std) using Welford's running mean/variance update.
+    """
+    lo = values[0]
+    hi = values[0]
+    mean = 0.0
+    m2 = 0.0
+    for i in range(values.shape[0]):
+        x = values[i]
+        if x < lo:
+            lo = x
+        if x > hi:
+            hi = x
+        delta = x - mean
+        mean += delta / (i + 1)
+        m2 += delta * (x - mean)
+    return lo, hi, mean, np.sqrt(m2 / values.shape[0])
 
 
 def analyze_column(values, column_name):
     """
-    Analyze a single column's values.
+    Analyze a single column's values (a list, or an Arrow string column).
     Returns a dictionary of statistics.
     """
     total = len(values)
-    non_empty = [v for v in values if v is not None and str(v).strip()]
-    
-    # Basic stats
-    fill_rate = len(non_empty) / total if total > 0 else 0
-    unique_values = set(str(v) for v in non_empty)
-    unique_count = len(unique_values)
-    
-    # Type detection
-    numeric_count = sum(1 for v in non_empty if is_likely_numeric(v))
-    price_count = sum(1 for v in non_empty if is_likely_price(v))
-    code_count = sum(1 for v in non_empty if is_likely_code(v))
-    
-    # Determine likely type
-    if len(non_empty) == 0:
-        likely_type = "empty"
-    elif price_count / len(non_empty) > 0.5:
-        likely_type = "price"
-    elif code_count / len(non_empty) > 0.5:
-        likely_type = "code"
-    elif numeric_count / len(non_empty) > 0.8:
-        likely_type = "numeric"
+    if not isinstance(values, (pa.Array, pa.ChunkedArray)):
+        # JSON values: the checks below only ever look at str(value)
+        values = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    
+    # Empty/whitespace-only/null cells are dropped in C before anything touches Python
+    filled = values.filter(pc.greater(pc.utf8_length(pc.utf8_trim_whitespace(values)), 0))
+    non_empty_count = len(filled)
+    
+    # Basic stats (distinct values are hashed in C; no Python set of every cell)
+    fill_rate = non_empty_count / total if total > 0 else 0
+    unique_count = pc.count_distinct(filled).as_py()
+    
+    # Type detection (the same pass parses the numbers used for numeric stats)
+    if non_empty_count == 0:
+        likely_type, amounts = "empty", None
     else:
-        likely_type = "text"
+        likely_type, amounts = classify_values(filled)
     
-    # Get sample values (diverse selection)
-    sample_values = []
-    if non_empty:
-        # Get first few, last few, and some random middle values
-        unique_list = list(unique_values)[:SAMPLE_SIZE * 2]
-        sample_values = unique_list[:SAMPLE_SIZE]
+    # Get sample values: the first distinct values seen, stopping as soon as there are
+    # enough (no hash table of every distinct value just to keep a handful)
+    samples = {}
+    start = 0
+    while len(samples) < SAMPLE_SIZE and start < non_empty_count:
+        samples.update(dict.fromkeys(filled.slice(start, SAMPLE_SCAN_CHUNK).to_pylist()))
+        start += SAMPLE_SCAN_CHUNK
+    sample_values = list(samples)[:SAMPLE_SIZE]
     
     # Numeric stats if applicable
     numeric_stats = None
-    if likely_type in ["price", "numeric"] and numeric_count > 0:
+    if likely_type in ["price", "numeric"]:
         try:
-            nums = []
-            for v in non_empty:
-                try:
-                    clean = str(v).replace('$', '').replace(',', '')
-                    nums.append(float(clean))
-                except:
-                    pass
+            nums = amounts.drop_null().to_numpy()
             
-            if nums:
+            if len(nums):
+                num_min, num_max, num_mean, num_std = numeric_summary(nums)
                 numeric_stats = {
-                    "min": min(nums),
-                    "max": max(nums),
-                    "mean": statistics.mean(nums),
-                    "median": statistics.median(nums) if len(nums) > 1 else nums[0]
+                    "min": num_min,
+                    "max": num_max,
+                    "mean": num_mean,
+                    "median": float(np.median(nums)),
+                    "std": num_std
                 }
         except:
             pass
     
-    # Pattern detection for column name
-    # IMPORTANT: Order matters! More specific patterns must come first
+    # Pattern detection for column name: first matching rule wins
     col_lower = column_name.lower()
     inferred_purpose = "unknown"
-    
-    # Check for payer/insurance FIRST (before "name" which could match "payer_name")
-    if any(k in col_lower for k in ['payer', 'insurance', 'carrier']):
-        inferred_purpose = "payer"
-    elif any(k in col_lower for k in ['plan', 'product']):
-        inferred_purpose = "plan"
-    elif any(k in col_lower for k in ['code', 'cpt', 'hcpcs', 'icd', 'drg', 'ndc']):
-        inferred_purpose = "code"
-    # Check for description, but exclude columns that are clearly payer-related
-    elif any(k in col_lower for k in ['desc', 'procedure', 'service']) or ('name' in col_lower and 'payer' not in col_lower and 'plan' not in col_lower):
-        inferred_purpose = "description"
-    elif any(k in col_lower for k in ['charge', 'price', 'amount', 'rate', 'dollar', 'cost']):
-        inferred_purpose = "price"
-    elif any(k in col_lower for k in ['type', 'class', 'category', 'setting']):
-        inferred_purpose = "category"
-    elif any(k in col_lower for k in ['note', 'comment', 'additional', 'modifier']):
-        inferred_purpose = "notes"
-    elif any(k in col_lower for k in ['gross', 'cash', 'discounted']):
-        inferred_purpose = "standard_charge"
-    elif any(k in col_lower for k in ['negotiated', 'contract']):
-        inferred_purpose = "negotiated_rate"
+    for purpose, pattern in PURPOSE_RULES:
+        if pattern.search(col_lower):
+            inferred_purpose = purpose
+            break
     
     return {
         "column_name": column_name,
         "fill_rate": round(fill_rate, 3),
         "unique_count": unique_count,
         "total_rows": total,
-        "non_empty_rows": len(non_empty),
+        "non_empty_rows": non_empty_count,
         "likely_type": likely_type,
         "inferred_purpose": inferred_purpose,
         "sample_values": sample_values[:SAMPLE_SIZE],
@@ -371,26 +588,29 @@ def detect_format_type(columns, column_analyses):
     Wide: One row per item, prices in columns
           Has many columns with payer names in them
     """
-    col_names_lower = [c.lower() for c in columns]
-    
-    # Check for tall format indicators
-    has_payer_column = any('payer' in c for c in col_names_lower)
-    has_plan_column = any('plan' in c for c in col_names_lower)
-    
-    # Check for wide format indicators (multiple price columns with payer names)
-    price_columns = [a for a in column_analyses if a['inferred_purpose'] in ['price', 'negotiated_rate', 'standard_charge']]
-    
-    # Count columns that look like "standard_charge|PayerName|..."
-    payer_in_column = sum(1 for c in columns if '|' in c and any(k in c.lower() for k in ['charge', 'dollar', 'amount']))
-    
-    if has_payer_column and has_plan_column:
-        return "tall"
-    elif payer_in_column > 5:
+    # One pass over the names: tall indicators, plus columns that look like
+    # "standard_charge|PayerName|..." (wide indicators)
+    has_payer_column = False
+    has_plan_column = False
+    payer_in_column = 0
+    for col in columns:
+        col_lower = col.lower()
+        has_payer_column = has_payer_column or 'payer' in col_lower
+        has_plan_column = has_plan_column or 'plan' in col_lower
+        if has_payer_column and has_plan_column:
+            return "tall"  # Decisive, whatever the remaining columns look like
+        if payer_in_column <= 5 and '|' in col and ('charge' in col_lower or 'dollar' in col_lower or 'amount' in col_lower):
+            payer_in_column += 1
+    
+    if payer_in_column > 5:
         return "wide"
-    elif len(price_columns) > 10:
+    
+    # Otherwise: multiple price columns means wide
+    price_purposes = ('price', 'negotiated_rate', 'standard_charge')
+    price_columns = sum(1 for a in column_analyses if a['inferred_purpose'] in price_purposes)
+    if price_columns > 10:
         return "wide"
-    else:
-        return "tall"  # Default assumption
+    return "tall"  # Default assumption
 
 
 def generate_config_template(profile, hospital_name=None):
@@ -427,17 +647,24 @@ def generate_config_template(profile, hospital_name=None):
     # e.g., 'code|1' -> 'code|1|type', 'code|2' -> 'code|2|type'
     matched_type_columns = []
     if code_only_columns and type_only_columns:
+        type_col_strs = [str(type_col) for type_col in type_only_columns]
+        # Code prefix ('code' for 'code|1') -> index of the first type column starting with it;
+        # code columns mostly share one prefix, so each prefix is only scanned for once
+        first_with_prefix = {}
         for code_col in code_only_columns:
             code_col_str = str(code_col)
-            # Try to find matching type column
-            matching_type = None
-            for type_col in type_only_columns:
-                type_col_str = str(type_col)
-                # Check if type column matches (e.g., 'code|1|type' matches 'code|1')
-                if code_col_str in type_col_str or type_col_str.startswith(code_col_str.split('|')[0]):
-                    matching_type = type_col
-                    break
-            matched_type_columns.append(matching_type)
+            prefix = code_col_str.split('|')[0]
+            if prefix not in first_with_prefix:
+                first_with_prefix[prefix] = next(
+                    (i for i, type_col_str in enumerate(type_col_strs) if type_col_str.startswith(prefix)),
+                    len(type_col_strs))
+            # First type column that contains the code column's name (e.g. 'code|1|type'
+            # matches 'code|1') or starts with its prefix; only those before the prefix hit need checking
+            prefix_idx = first_with_prefix[prefix]
+            match_idx = next(
+                (i for i, type_col_str in enumerate(type_col_strs[:prefix_idx]) if code_col_str in type_col_str),
+                prefix_idx)
+            matched_type_columns.append(type_only_columns[match_idx] if match_idx < len(type_only_columns) else None)
     elif not type_only_columns:
         # No type columns found, set to None
         matched_type_columns = [None] * len(code_only_columns) if code_only_columns else None
@@ -503,6 +730,111 @@ def generate_config_template(profile, hospital_name=None):
     return template
 
 
+def read_csv_sample(file_path):
+    """
+    Detect encoding and header row, then read the data row sample.
+    Returns (encoding, header_row_idx, columns, col_arrays, total_rows);
+    columns is None when no header row could be found.
+    """
+    # Detect encoding
+    encoding = detect_encoding(file_path)
+    
+    # Map the file once: the header probe, the Arrow reader and the csv fallback share its pages
+    with pa.memory_map(str(file_path)) as source:
+        # First, read some rows to detect header
+        first_rows = read_header_rows(source, encoding)
+        
+        # Detect header row
+        header_row_idx = detect_header_row(first_rows)
+        if header_row_idx >= len(first_rows):
+            return encoding, header_row_idx, None, [], 0
+        
+        columns = first_rows[header_row_idx]
+        
+        # Read data rows (a MAX_ROWS_TO_ANALYZE sample) straight into Arrow columns
+        try:
+            source.seek(0)
+            col_arrays, row_count = read_data_columns(source, encoding, header_row_idx, len(columns))
+        except (pa.ArrowInvalid, UnicodeDecodeError):
+            # Ragged rows or bad bytes: fall back to the forgiving csv module
+            source.seek(0)
+            f = io.TextIOWrapper(source, encoding=encoding, errors='replace')
+            reader = csv.reader(f)
+            
+            # Skip to header
+            for _ in range(header_row_idx + 1):
+                next(reader, None)
+            
+            # Fill one list per column in the same pass (short rows pad with None),
+            # reservoir-sampling MAX_ROWS_TO_ANALYZE rows (Algorithm R)
+            num_columns = len(columns)
+            col_lists = [[] for _ in range(num_columns)]
+            rng = random.Random(SAMPLE_SEED)
+            row_count = 0
+            
+            for row in reader:
+                row_count += 1
+                if len(row) < num_columns:
+                    row = row + [None] * (num_columns - len(row))
+                if row_count <= MAX_ROWS_TO_ANALYZE:
+                    for col_values, value in zip(col_lists, row):
+                        col_values.append(value)
+                else:
+                    slot = rng.randrange(row_count)
+                    if slot < MAX_ROWS_TO_ANALYZE:
+                        for col_values, value in zip(col_lists, row):
+                            col_values[slot] = value
+            
+            col_arrays = [pa.array(col_values, type=pa.string()) for col_values in col_lists]
+            f.detach()
+    
+    return encoding, header_row_idx, columns, col_arrays, row_count
+
+
+def sample_cache_path(file_path):
+    """Where the parsed sample of a CSV is cached (kept apart from the ingest's full-file .parquet)."""
+    return file_path.with_name(file_path.name + ".sample.parquet")
+
+
+def load_cached_sample(file_path):
+    """
+    Load the cached sample if it is newer than the CSV and was taken with the
+    current sampling settings. Returns the read_csv_sample tuple, or None.
+    """
+    cache_path = sample_cache_path(file_path)
+    if not cache_path.exists() or cache_path.stat().st_mtime < file_path.stat().st_mtime:
+        return None
+    try:
+        table = pq.read_table(cache_path)
+        meta = json.loads(table.schema.metadata[b"analysis"])
+    except Exception:
+        return None  # Unreadable cache: just re-parse
+    if meta["max_rows"] != MAX_ROWS_TO_ANALYZE or meta["seed"] != SAMPLE_SEED:
+        return None
+    return meta["encoding"], meta["header_row"], meta["columns"], table.columns, meta["total_rows"]
+
+
+def save_cached_sample(file_path, encoding, header_row_idx, columns, col_arrays, total_rows):
+    """Write the parsed sample as Parquet; written to a temp file and renamed so it is never partial."""
+    meta = {
+        "encoding": encoding,
+        "header_row": header_row_idx,
+        "columns": columns,
+        "total_rows": total_rows,
+        "max_rows": MAX_ROWS_TO_ANALYZE,
+        "seed": SAMPLE_SEED
+    }
+    table = pa.table(col_arrays, names=[f"f{i}" for i in range(len(col_arrays))])
+    table = table.replace_schema_metadata({"analysis": json.dumps(meta)})
+    cache_path = sample_cache_path(file_path)
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    try:
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # Read-only download dir: analysis still works, just uncached
+
+
 def analyze_csv_file(file_path):
     """
     Analyze a CSV file and return a comprehensive profile.
@@ -525,64 +857,30 @@ def analyze_csv_file(file_path):
     }
     
     try:
-        # Detect encoding
-        encoding = detect_encoding(file_path)
+        # Parse the CSV, or reuse the Parquet copy of an earlier parse
+        sample = load_cached_sample(file_path)
+        if sample is None:
+            sample = read_csv_sample(file_path)
+            if sample[2] is not None:
+                save_cached_sample(file_path, *sample)
+        encoding, header_row_idx, columns, col_arrays, row_count = sample
+        
         profile["encoding"] = encoding
+        profile["header_row"] = header_row_idx
         
-        # Read file
-        with open(file_path, 'r', encoding=encoding, errors='replace') as f:
-            # First, read some rows to detect header
-            reader = csv.reader(f)
-            first_rows = []
-            for i, row in enumerate(reader):
-                first_rows.append(row)
-                if i >= 15:  # Read first 16 rows for header detection
-                    break
-            
-            # Detect header row
-            header_row_idx = detect_header_row(first_rows)
-            profile["header_row"] = header_row_idx
-            
-            if header_row_idx >= len(first_rows):
-                profile["errors"].append("Could not detect header row")
-                return profile
-            
-            columns = first_rows[header_row_idx]
-            profile["columns"] = columns
-            profile["total_columns"] = len(columns)
-            
-            # Reset file and skip to data
-            f.seek(0)
-            reader = csv.reader(f)
-            
-            # Skip to header
-            for _ in range(header_row_idx + 1):
-                next(reader, None)
-            
-            # Read data rows (up to MAX_ROWS_TO_ANALYZE)
-            data_rows = []
-            row_count = 0
-            
-            for row in reader:
-                if row_count >= MAX_ROWS_TO_ANALYZE:
-                    break
-                data_rows.append(row)
-                row_count += 1
-            
-            profile["total_rows"] = row_count
-            
-            if row_count >= MAX_ROWS_TO_ANALYZE:
-                profile["warnings"].append(f"File truncated for analysis (analyzed {MAX_ROWS_TO_ANALYZE} rows)")
+        if columns is None:
+            profile["errors"].append("Could not detect header row")
+            return profile
+        
+        profile["columns"] = columns
+        profile["total_columns"] = len(columns)
+        profile["total_rows"] = row_count
+        
+        if row_count > MAX_ROWS_TO_ANALYZE:
+            profile["warnings"].append(f"Analyzed a random sample of {MAX_ROWS_TO_ANALYZE:,} of {row_count:,} rows")
         
         # Analyze each column
-        for col_idx, col_name in enumerate(columns):
-            col_values = []
-            for row in data_rows:
-                if col_idx < len(row):
-                    col_values.append(row[col_idx])
-                else:
-                    col_values.append(None)
-            
+        for col_name, col_values in zip(columns, col_arrays):
             col_analysis = analyze_column(col_values, col_name)
             profile["column_analyses"].append(col_analysis)
         
@@ -609,26 +907,14 @@ def analyze_csv_file(file_path):
                            or likely_type == "price")
             
             if is_price_col:
-                # Check for placeholder values in sample data
+                # Placeholder-heavy: mostly filled and every parsed value is the same
+                # large number (e.g. all 999999999), read off the column's numeric stats
                 sample_values = a.get("sample_values", [])
-                is_placeholder_heavy = False
-                if sample_values and fill_rate > 0.5:  # Only check if mostly filled
-                    # Check if all sample values are the same large number (placeholder)
-                    try:
-                        numeric_samples = []
-                        for val in sample_values[:10]:  # Check up to 10 samples
-                            try:
-                                num = float(str(val).replace('$', '').replace(',', ''))
-                                numeric_samples.append(num)
-                            except:
-                                pass
-                        
-                        if numeric_samples:
-                            # If all values are the same and > 999999, likely placeholder
-                            if len(set(numeric_samples)) == 1 and numeric_samples[0] >= 999999:
-                                is_placeholder_heavy = True
-                    except:
-                        pass
+                numeric_stats = a.get("numeric_stats")
+                is_placeholder_heavy = bool(
+                    numeric_stats and fill_rate > 0.5
+                    and numeric_stats["min"] == numeric_stats["max"] >= 999999
+                )
                 
                 price_column_candidates.append({
                     "column_name": col_name,
@@ -760,32 +1046,32 @@ def analyze_json_file(file_path):
     }
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        parsed = None
+        if file_path.stat().st_size <= JSON_LOAD_MAX_BYTES:
+            parsed = load_json_file(file_path)
+        root_event, top_level_keys, metadata, arrays = parsed or scan_json_file(file_path)
         
         # Analyze structure
-        if isinstance(data, list):
+        if root_event == 'start_array':
             profile["json_structure"] = "array_of_objects"
-            profile["total_records"] = len(data)
-            records = data
+            records, total_records = arrays['']
+            profile["total_records"] = total_records
             
-        elif isinstance(data, dict):
+        elif root_event == 'start_map':
             profile["json_structure"] = "object"
-            keys = list(data.keys())
-            profile["detected_patterns"]["top_level_keys"] = keys[:20]
+            profile["detected_patterns"]["top_level_keys"] = top_level_keys[:20]
             
             # Extract hospital metadata
-            metadata_keys = ['hospital_name', 'last_updated_on', 'version', 'hospital_location', 'hospital_address']
-            for key in metadata_keys:
-                if key in data:
-                    profile["hospital_metadata"][key] = data[key]
+            for key in JSON_METADATA_KEYS:
+                if key in metadata:
+                    profile["hospital_metadata"][key] = metadata[key]
             
             # Look for the charge information array
             records = None
-            for key in ['standard_charge_information', 'charges', 'items', 'data']:
-                if key in data and isinstance(data[key], list):
-                    records = data[key]
-                    profile["total_records"] = len(records)
+            for key in JSON_RECORD_KEYS:
+                if key in arrays:
+                    records, total_records = arrays[key]
+                    profile["total_records"] = total_records
                     break
             
             if not records:
@@ -795,18 +1081,17 @@ def analyze_json_file(file_path):
             profile["errors"].append("Unexpected JSON structure (not object or array)")
             return profile
         
-        # Analyze the records structure
+        # Analyze the records structure (a json_sample_size prefix of the MAX_JSON_RECORDS kept)
         if records and len(records) > 0:
-            # Sample records for analysis (up to MAX_JSON_RECORDS)
-            sample_count = min(len(records), MAX_JSON_RECORDS)
+            sample_count = json_sample_size(records, total_records)
             sample_records = records[:sample_count]
             
-            if sample_count < len(records):
-                profile["warnings"].append(f"Analyzed {sample_count:,} of {len(records):,} records")
+            if sample_count < total_records:
+                profile["warnings"].append(f"Analyzed {sample_count:,} of {total_records:,} records")
             
             # Store sample record
             first_record = records[0]
-            if len(str(first_record)) < 5000:
+            if not record_size_exceeds(first_record, SAMPLE_RECORD_MAX_CHARS):
                 profile["sample_record"] = first_record
             else:
                 profile["sample_record"] = {"note": "Record too large, showing keys only", "keys": list(first_record.keys()) if isinstance(first_record, dict) else []}
@@ -822,26 +1107,34 @@ def analyze_json_file(file_path):
                 profile["columns"] = list(all_keys)
                 profile["total_columns"] = len(all_keys)
                 
+                # Gather every "column" (key) in one pass over the records: missing keys stay None
+                dict_records = [record for record in sample_records if isinstance(record, dict)]
+                key_values = {key: [None] * len(dict_records) for key in all_keys}
+                for row, record in enumerate(dict_records):
+                    for key, val in record.items():
+                        values = key_values.get(key)
+                        if values is None:
+                            continue  # Key first seen after the records checked above
+                        # Flatten nested structures for analysis
+                        if isinstance(val, (list, dict)):
+                            values[row] = str(val)[:100]  # Truncate complex values
+                        else:
+                            values[row] = val
+                
                 # Analyze each "column" (key)
-                for key in all_keys:
-                    values = []
-                    for record in sample_records:
-                        if isinstance(record, dict):
-                            val = record.get(key)
-                            # Flatten nested structures for analysis
-                            if isinstance(val, (list, dict)):
-                                values.append(str(val)[:100])  # Truncate complex values
-                            else:
-                                values.append(val)
-                    
+                for key, values in key_values.items():
                     col_analysis = analyze_column(values, key)
                     profile["column_analyses"].append(col_analysis)
                 
-                # Detect patterns specific to JSON hospital files
-                code_cols = [a["column_name"] for a in profile["column_analyses"] 
-                            if a["inferred_purpose"] == "code" or 'code' in a["column_name"].lower()]
-                desc_cols = [a["column_name"] for a in profile["column_analyses"] 
-                            if a["inferred_purpose"] == "description" or 'desc' in a["column_name"].lower()]
+                # Detect patterns specific to JSON hospital files (one pass, each name lowercased once)
+                code_cols = []
+                desc_cols = []
+                for a in profile["column_analyses"]:
+                    col_lower = a["column_name"].lower()
+                    if a["inferred_purpose"] == "code" or 'code' in col_lower:
+                        code_cols.append(a["column_name"])
+                    if a["inferred_purpose"] == "description" or 'desc' in col_lower:
+                        desc_cols.append(a["column_name"])
                 
                 # Check for nested structures common in hospital JSON
                 has_code_info = 'code_information' in all_keys
@@ -871,7 +1164,7 @@ def analyze_json_file(file_path):
                 # Generate config template for JSON files
                 profile["config_template"] = generate_config_template(profile, hospital_name=None)
             
-    except json.JSONDecodeError as e:
+    except ijson.JSONError as e:
         profile["errors"].append(f"JSON parse error: {str(e)}")
     except MemoryError:
         profile["errors"].append("File too large to parse in memory")
@@ -881,6 +1174,152 @@ def analyze_json_file(file_path):
     return profile
 
 
+def read_json_value(event, value, events):
+    """Build one JSON value from an ijson event stream, starting at its first event."""
+    builder = ijson.ObjectBuilder()
+    builder.event(event, value)
+    depth = 1 if event in ('start_map', 'start_array') else 0
+    while depth:
+        _, event, value = next(events)
+        builder.event(event, value)
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+    return builder.value
+
+
+def record_size_exceeds(record, limit):
+    """
+    Whether str(record) would run to `limit` characters or more, estimated by walking
+    the record and stopping as soon as the running total gets there (the string is
+    never built).
+    """
+    size = 0
+    pending = [record]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, dict):
+            size += max(2, 4 * len(value))  # Braces, ': ' per item and ', ' between items
+        elif isinstance(value, (list, tuple)):
+            size += max(2, 2 * len(value))  # Brackets and ', ' between items
+        elif isinstance(value, str):
+            size += len(value) + 2  # Quotes
+        else:
+            size += len(repr(value))
+        if size >= limit:
+            return True
+        
+        if isinstance(value, dict):
+            pending.extend(value.keys())
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            pending.extend(value)
+    return False
+
+
+def json_sample_size(records, total_records):
+    """
+    How many of the kept records to analyze. Grows with the share of distinct record
+    shapes (key sets) and sublinearly with the record count:
+    min + sqrt(distinct / total) * min + total / sqrt(min), capped at the records kept.
+    """
+    if JSON_SAMPLE_OVERRIDE > 0:
+        return min(JSON_SAMPLE_OVERRIDE, len(records))
+    
+    probe = records[:JSON_SHAPE_PROBE]
+    shapes = {frozenset(record) for record in probe if isinstance(record, dict)}
+    distinct_ratio = len(shapes) / len(probe)
+    size = (JSON_SAMPLE_MIN + math.sqrt(distinct_ratio) * JSON_SAMPLE_MIN
+            + total_records / math.sqrt(JSON_SAMPLE_MIN))
+    return min(len(records), int(size))
+
+
+def load_json_file(file_path):
+    """
+    Parse a small JSON file in one call (orjson when installed).
+    Returns the same tuple as scan_json_file, or None if the file doesn't parse,
+    so the streaming scan can report the error.
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    try:
+        doc = orjson.loads(data) if orjson is not None else json.loads(data)
+    except ValueError:
+        return None
+    
+    if isinstance(doc, list):
+        return 'start_array', [], {}, {'': [doc[:MAX_JSON_RECORDS], len(doc)]}
+    if not isinstance(doc, dict):
+        return None, [], {}, {}  # Scalar root
+    
+    metadata = {key: doc[key] for key in JSON_METADATA_KEYS if key in doc}
+    arrays = {key: [doc[key][:MAX_JSON_RECORDS], len(doc[key])]
+              for key in JSON_RECORD_KEYS if isinstance(doc.get(key), list)}
+    return 'start_map', list(doc), metadata, arrays
+
+
+def map_for_scan(f):
+    """
+    Memory-map an open binary file for one front-to-back pass, so the parser reads
+    straight from the page cache. Empty files can't be mapped and are returned as-is.
+    """
+    if os.fstat(f.fileno()).st_size == 0:
+        return contextlib.nullcontext(f)
+    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, 'MADV_SEQUENTIAL'):  # Not on Windows
+        mapped.madvise(mmap.MADV_SEQUENTIAL)  # Read ahead aggressively, drop pages behind
+    return mapped
+
+
+def scan_json_file(file_path):
+    """
+    Stream a JSON file once with ijson, never holding the whole document.
+    Returns (root_event, top_level_keys, metadata, arrays) where arrays maps each
+    record key ('' for a top-level array) to [first MAX_JSON_RECORDS items, total items].
+    """
+    root_event = None
+    top_level_keys = []
+    metadata = {}
+    arrays = {}
+    item_prefixes = {}  # ijson prefix of array items -> record key
+    
+    with open(file_path, 'rb') as f, map_for_scan(f) as source:
+        events = ijson.parse(source, use_float=True)  # Floats, like json.load
+        for prefix, event, value in events:
+            # 1. Root: object or array, anything else is unexpected
+            if root_event is None:
+                root_event = event
+                if event == 'start_array':
+                    arrays[''] = [[], 0]
+                    item_prefixes['item'] = ''
+                elif event != 'start_map':
+                    break
+                continue
+            
+            if root_event == 'start_map':
+                # 2. Top-level keys, metadata values and the candidate charge arrays
+                if prefix == '' and event == 'map_key':
+                    top_level_keys.append(value)
+                    continue
+                if prefix in JSON_METADATA_KEYS and event in JSON_VALUE_EVENTS:
+                    metadata[prefix] = read_json_value(event, value, events)
+                    continue
+                if prefix in JSON_RECORD_KEYS and event == 'start_array':
+                    arrays[prefix] = [[], 0]
+                    item_prefixes[f"{prefix}.item"] = prefix
+                    continue
+            
+            # 3. Array items: build the first MAX_JSON_RECORDS, only count the rest
+            if prefix in item_prefixes and event in JSON_VALUE_EVENTS:
+                records = arrays[item_prefixes[prefix]]
+                records[1] += 1
+                if records[1] <= MAX_JSON_RECORDS:
+                    records[0].append(read_json_value(event, value, events))
+    
+    return root_event, top_level_keys, metadata, arrays
+
+
 def process_hospital(hospital_id, download_info, analysis_manifest):
     """
     Process a single hospital's downloaded file.
@@ -890,11 +1329,9 @@ def process_hospital(hospital_id, download_info, analysis_manifest):
     file_path = download_info.get("file_path")
     file_type = download_info.get("file_type", "csv")
     
-    # Check if already analyzed
-    if hospital_id in analysis_manifest["analyses"]:
-        status = analysis_manifest["analyses"][hospital_id].get("status")
-        if status == "completed":
-            return "skipped"
+    # Check if already analyzed (and the file hasn't been re-downloaded since)
+    if is_already_analyzed(analysis_manifest, hospital_id, download_info):
+        return "skipped"
     
     print(f"\n{'='*60}")
     print(f"Analyzing: {hospital_name}")
@@ -912,6 +1349,7 @@ def process_hospital(hospital_id, download_info, analysis_manifest):
     
     file_path = Path(file_path)
     actual_file_type = file_type
+    fingerprint = file_fingerprint(file_path)  # Of the download itself (the ZIP, not its member)
     
     # Handle ZIP files - extract and find data file
     if file_type == "zip":
@@ -958,8 +1396,12 @@ def process_hospital(hospital_id, download_info, analysis_manifest):
         
         # Save profile
         profile_file = PROFILES_DIR / f"{hospital_id}.json"
-        with open(profile_file, 'w') as f:
-            json.dump(profile, f, indent=2, default=str)
+        if orjson is not None:
+            # One encode straight to UTF-8 bytes, one write
+            profile_file.write_bytes(orjson.dumps(profile, default=str, option=PROFILE_JSON_OPTIONS))
+        else:
+            with open(profile_file, 'w') as f:
+                json.dump(profile, f, indent=2, default=str)
         
         # Get row/record count safely
         total_rows = profile.get("total_rows") or profile.get("total_records") or 0
@@ -969,6 +1411,7 @@ def process_hospital(hospital_id, download_info, analysis_manifest):
         analysis_manifest["analyses"][hospital_id] = {
             "name": hospital_name,
             "status": "completed",
+            "fingerprint": fingerprint,
             "profile_file": str(profile_file),
             "file_type": actual_file_type,
             "original_type": file_type,
@@ -1015,6 +1458,60 @@ def process_hospital(hospital_id, download_info, analysis_manifest):
         return "failed"
 
 
+def analyze_hospital_worker(args):
+    """
+    Run process_hospital in a worker process against a private manifest.
+    Returns (hospital_id, status, manifest entry, captured output).
+    """
+    hospital_id, download_info = args
+    manifest = {"analyses": {}}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        status = process_hospital(hospital_id, download_info, manifest)
+    return hospital_id, status, manifest["analyses"].get(hospital_id), output.getvalue()
+
+
+def analyze_many(pending, analysis_manifest, stats):
+    """
+    Analyze (hospital_id, download_info) pairs in parallel worker processes.
+    Only this process touches the manifest: entries are merged and saved as results arrive.
+    """
+    with ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS) as executor:
+        future_to_hospital = {
+            executor.submit(analyze_hospital_worker, item): item for item in pending
+        }
+        
+        try:
+            for i, future in enumerate(as_completed(future_to_hospital)):
+                hospital_id, download_info = future_to_hospital[future]
+                try:
+                    hospital_id, status, entry, output = future.result()
+                except Exception as e:
+                    status, output = "failed", f"\n  ❌ Analysis failed: {str(e)}\n"
+                    entry = {
+                        "name": download_info.get("name", "Unknown"),
+                        "status": "failed",
+                        "error": str(e),
+                        "timestamp": datetime.now().isoformat()
+                    }
+                
+                # Each worker's log is printed in one piece so hospitals don't interleave
+                print(f"\n[{i+1}/{len(pending)}]", end="")
+                print(output, end="")
+                
+                if entry is not None:
+                    analysis_manifest["analyses"][hospital_id] = entry
+                stats[status] = stats.get(status, 0) + 1
+                
+                # Save manifest periodically
+                if (i + 1) % MANIFEST_SAVE_EVERY == 0:
+                    analysis_manifest["stats"] = stats
+                    save_analysis_manifest(analysis_manifest)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
 def main():
     """Main analysis orchestrator."""
     print("=" * 60)
@@ -1039,27 +1536,24 @@ def main():
     analysis_manifest = load_analysis_manifest()
     analysis_manifest["stats"]["total"] = len(completed_downloads)
     
-    # Count existing analyses
-    already_done = sum(1 for h_id in completed_downloads 
-                       if analysis_manifest["analyses"].get(h_id, {}).get("status") == "completed")
-    print(f"Already analyzed: {already_done}")
-    print(f"Remaining: {len(completed_downloads) - already_done}")
-    
-    # Process each hospital
+    # Process each hospital not yet analyzed (or re-downloaded since), in parallel
     stats = {"completed": 0, "failed": 0, "skipped": 0}
+    pending = []
+    for hospital_id, download_info in completed_downloads.items():
+        if is_already_analyzed(analysis_manifest, hospital_id, download_info):
+            stats["skipped"] += 1
+        else:
+            pending.append((hospital_id, download_info))
+    
+    print(f"Already analyzed: {stats['skipped']}")
+    print(f"Remaining: {len(pending)}")
+    print(f"Using {ANALYSIS_WORKERS} worker processes")
+    
+    # Treat SIGTERM like Ctrl-C so a killed run still makes the final manifest save
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     
     try:
-        for i, (hospital_id, download_info) in enumerate(completed_downloads.items()):
-            print(f"\n[{i+1}/{len(completed_downloads)}]", end="")
-            
-            status = process_hospital(hospital_id, download_info, analysis_manifest)
-            stats[status] = stats.get(status, 0) + 1
-            
-            # Save manifest periodically
-            if (i + 1) % 10 == 0:
-                analysis_manifest["stats"] = stats
-                save_analysis_manifest(analysis_manifest)
-                
+        analyze_many(pending, analysis_manifest, stats)
     except KeyboardInterrupt:
         print("\n\n⚠️  Interrupted by user. Progress saved.")
     
@@ -82,7 +82,7 @@ def load_profile(hospital_id):
     if not profile_file.exists():
         return None
     
-    with open(profile_file, 'r') as f:
+    with open(profile_file, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 
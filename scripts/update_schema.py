@@ -9,19 +9,31 @@ engine = create_engine(DB_URL, echo=False)
 def add_column_if_not_exists(connection, table, column, col_type):
     try:
         # Check if column exists
+        # Each step runs in its own savepoint: a failed statement aborts the whole
+        # transaction on Postgres unless it is rolled back to a savepoint first
         query = text(f"SELECT {column} FROM {table} LIMIT 1")
-        connection.execute(query)
+        with connection.begin_nested():
+            connection.execute(query)
         print(f"Column '{column}' already exists in '{table}'.")
     except Exception:
         # If it fails, the column likely doesn't exist, so add it
         print(f"Adding column '{column}' to '{table}'...")
         try:
             alter_query = text(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
-            connection.execute(alter_query)
+            with connection.begin_nested():
+                connection.execute(alter_query)
             print("Success.")
         except Exception as e:
             print(f"Failed to add column: {e}")
 
+def create_index_if_not_exists(connection, name, table, columns):
+    print(f"Ensuring index '{name}' on '{table}' ({', '.join(columns)})...")
+    try:
+        with connection.begin_nested():
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+    except Exception as e:
+        print(f"Failed to create index: {e}")
+
 def update_schema():
     print("--- Updating Database Schema for AI Generated Content ---")
     with engine.connect() as conn:
@@ -40,6 +52,10 @@ def update_schema():
         # Add category (if we want to store the inferred category)
         add_column_if_not_exists(conn, "code_definitions", "category", "VARCHAR")
         
+        # Indexes for code lookups and item -> prices joins (older DBs lack the composite one)
+        create_index_if_not_exists(conn, "ix_items_code", "items", ["code"])
+        create_index_if_not_exists(conn, "ix_prices_item_payer", "prices", ["item_id", "payer"])
+        
         conn.commit()
     print("--- Schema Update Complete ---")
 
@@ -1,10 +1,29 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey
+import os
+from sqlalchemy import create_engine, make_url, Column, Integer, String, Float, ForeignKey, Index
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 
 # Define the database file (local SQLite for now)
-DB_URL = "sqlite:///hospital.db"
+# STAGING_DB lets the ingest pipeline point a single script at its own file
+DB_PATH = os.environ.get("STAGING_DB", "hospital.db")
+# DATABASE_URL points everything at a server database instead (e.g. postgresql://...).
+# It takes precedence over STAGING_DB, so scripts/ingest_all.py skips its staging/merge
+# step and resets the server's items/prices tables when it is set.
+DB_URL = os.environ.get("DATABASE_URL", f"sqlite:///{DB_PATH}")
 
-engine = create_engine(DB_URL, echo=False)
+def engine_options(url):
+    """Driver-specific create_engine() options for the bulk ingest scripts."""
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql" and url.get_driver_name() == "psycopg2":
+        # Send executemany() as multi-row VALUES pages (INSERTs) and
+        # execute_batch() pages (UPDATEs/DELETEs) instead of one statement per row
+        return {
+            "executemany_mode": "values_plus_batch",
+            "insertmanyvalues_page_size": 5000,
+            "executemany_batch_page_size": 1000,
+        }
+    return {}
+
+engine = create_engine(DB_URL, echo=False, **engine_options(DB_URL))
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
@@ -35,6 +54,11 @@ class Price(Base):
     # Relationship back to item
     item = relationship("Item", back_populates="prices")
 
+    # Covers the item -> prices lookup (and per-payer filtering within an item)
+    __table_args__ = (
+        Index("ix_prices_item_payer", "item_id", "payer"),
+    )
+
 class CodeDefinition(Base):
     __tablename__ = "code_definitions"
     
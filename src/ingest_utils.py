@@ -0,0 +1,121 @@
+"""
+Helpers shared by the ingest scripts (scripts/ingest_tall.py and scripts/ingest_wide.py):
+streaming CSV reads and the code-priority rules. The definition loaders
+(scripts/ingest_hcpcs_definitions.py, ai_workbench/scripts/ingest_icd10.py) share
+the bulk-load sqlite3 connection.
+"""
+import re
+import csv
+import codecs
+import sqlite3
+import contextlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Bytes of CSV parsed (and held in memory) per chunk
+CSV_BLOCK_SIZE = 64 * 1024 * 1024
+
+# Price cells that are text formulas rather than numbers ('Formula' is case-sensitive, 'algorithm' is not)
+FORMULA_RE = re.compile(r'Formula|(?i:algorithm)')
+
+# Lower number = preferred code system when a row lists several codes
+PRIORITY_MAP = {
+    'CPT': 1,
+    'HCPCS': 2,
+    'MS-DRG': 3,
+    'APR-DRG': 4,
+    'NDC': 5,
+    'CDM': 99,
+    'Local': 99,
+    'RC': 99,
+    'UNKNOWN': 100
+}
+
+# The same priorities as an array indexed by Categorical code; unlisted or
+# missing types get code -1, which lands on the trailing 100
+PRIORITY_CATEGORIES = list(PRIORITY_MAP)
+PRIORITY_VALUES = np.array(list(PRIORITY_MAP.values()) + [100], dtype=np.int8)
+
+def detect_encoding(file_path, candidates=('utf-8', 'iso-8859-1')):
+    """
+    Returns the first encoding that decodes the whole file.
+    Checked up front so a bad byte near the end doesn't abort a load
+    after most of the file has already been streamed in.
+    """
+    for encoding in candidates:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(file_path, 'rb') as f:
+                while block := f.read(CSV_BLOCK_SIZE):
+                    decoder.decode(block)
+                decoder.decode(b'', final=True)
+            return encoding
+        except UnicodeDecodeError:
+            print(f"{encoding} failed. Trying the next encoding...")
+    return candidates[-1]
+
+def read_csv_batches(file_path, header_row=2, encoding='utf-8'):
+    """
+    Streams the CSV with pyarrow's multithreaded parser, one record batch per block,
+    so memory stays flat no matter how large the file is.
+    Every column is kept as a string (prices are parsed by ingest_tall's parse_price_array
+    or ingest_wide's parse_price_series);
+    empty cells come back as nulls, like pandas' NaN.
+    """
+    # The header sits below a preamble, and we need the names to pin string types
+    with open(file_path, newline='', encoding=encoding) as f:
+        reader = csv.reader(f)
+        for _ in range(header_row):
+            next(reader)
+        column_names = next(reader)
+
+    yield from pacsv.open_csv(
+        file_path,
+        read_options=pacsv.ReadOptions(
+            skip_rows=header_row + 1,
+            column_names=column_names,
+            encoding=encoding,
+            block_size=CSV_BLOCK_SIZE,
+        ),
+        convert_options=pacsv.ConvertOptions(
+            column_types={col: pa.string() for col in column_names},
+            strings_can_be_null=True,
+        ),
+    )
+
+def column_values(df, col, default=None):
+    """Returns a column as an object array, or `default` for every row if the column is missing."""
+    if col in df.columns:
+        return df[col].to_numpy(dtype=object)
+    return np.full(len(df), default, dtype=object)
+
+def column_series(df, col):
+    """Returns a column as a Series, or an all-missing Series if the column is missing."""
+    if col in df.columns:
+        return df[col]
+    return pd.Series(None, index=df.index, dtype=object)
+
+def code_priorities(types):
+    return PRIORITY_VALUES[pd.Categorical(types, categories=PRIORITY_CATEGORIES).codes]
+
+@contextlib.contextmanager
+def bulk_load_connection(db_path):
+    """
+    Opens a raw sqlite3 connection tuned for a one-shot bulk load.
+    journal_mode=WAL is stored in the database file, so the previous journal
+    mode is restored on exit (which also removes the -wal/-shm files).
+    """
+    conn = sqlite3.connect(db_path)
+    previous_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    try:
+        yield conn
+    finally:
+        conn.rollback()  # No-op after a commit; the mode can't change inside a transaction
+        conn.execute(f'PRAGMA journal_mode={previous_mode}')
+        conn.close()